@@ -3,10 +3,26 @@ import textwrap
 import time
 import traceback
 from multiprocessing import context
-from typing import Any, Callable, Dict, Iterable, Tuple
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Tuple,
+    Union,
+)
 
-from core.providers.provider import UNEXPECTED_ERROR_OCCURRED_TEMPLATE, Provider
+from core.providers.provider import (
+    UNEXPECTED_ERROR_OCCURRED_TEMPLATE,
+    MaterializationError,
+    Provider,
+)
 from models.phase import Execution, Message
+from utils.events import emit_event, has_event_queue
+from utils.executor import run_in_executor
 
 DEFAULT_FEEDBACK = Message(
     src="system", type="info", text="Commands executed successfully."
@@ -27,13 +43,15 @@ async def __wrapper_func__(__ctx__):
 
 
 async def execute(
-    commands: Iterable[str],
+    commands: Union[Iterable[str], AsyncIterable[str]],
     provider: Provider,
 ) -> Execution:
     execution = Execution(feedback=DEFAULT_FEEDBACK)
     context = provider.get_context()
+    snapshot = context.snapshot()
+    feedback_varnames = []
 
-    for cmd in commands:
+    async for cmd in iter_commands(commands):
         start = time.time()
         end = None
 
@@ -62,13 +80,80 @@ async def execute(
         duration = end - start
         execution.commands.append(cmd)
         execution.durations.append(duration)
+        feedback_varnames.extend(execution.feedback.varnames or [])
+        emit_event(
+            "command",
+            command=cmd,
+            duration=duration,
+            feedback=execution.feedback.model_dump(),
+        )
 
         if execution.feedback.type != "info" or execution.response:
             break
 
+    if not execution.commands:
+        return execution
+
+    try:
+        await provider.materialize_context()
+
+    except MaterializationError as e:
+        context.restore(snapshot, e.varnames)
+        cmd = find_assigning_command(execution.commands, e.varnames)
+        feedback_text = UNEXPECTED_ERROR_OCCURRED_TEMPLATE.format(
+            c=cmd, t=type(e.error).__name__, e=e.error
+        )
+        execution.feedback = Message(src="system", type="error", text=feedback_text)
+        execution.response = None
+        execution.traceback = traceback.format_exc()
+
+    else:
+        await emit_attachments(feedback_varnames, provider)
+
     return execution
 
 
+async def emit_attachments(varnames: List[str], provider: Provider) -> None:
+    if not has_event_queue():
+        return
+
+    context = provider.get_context()
+
+    for varname in varnames:
+        try:
+            file = await run_in_executor(
+                provider.convert_object_to_file, context.get(varname)
+            )
+        except NotImplementedError:
+            continue
+
+        emit_event("attachment", file=file)
+
+
+def find_assigning_command(commands: List[str], varnames: List[str]) -> str:
+    for cmd in commands:
+        targets = {
+            node.id
+            for node in ast.walk(ast.parse(cmd))
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store)
+        }
+        if targets.intersection(varnames):
+            return cmd
+
+    return commands[-1]
+
+
+async def iter_commands(
+    commands: Union[Iterable[str], AsyncIterable[str]],
+) -> AsyncIterator[str]:
+    if isinstance(commands, AsyncIterable):
+        async for cmd in commands:
+            yield cmd
+    else:
+        for cmd in commands:
+            yield cmd
+
+
 class NameReplacer(ast.NodeTransformer):
     def __init__(self, context: Dict[str, Any], context_name: str) -> None:
         super().__init__()
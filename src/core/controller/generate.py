@@ -1,16 +1,20 @@
+import asyncio
 import time
 import traceback
-from typing import List
+from typing import AsyncIterator, List
 
 from core.controller.execute import execute
-from core.controller.helpers import extract_thinking_commands
+from core.controller.helpers import CommandStreamParser
 from core.controller.prompt import HELPER_PROMPT, create_prompt
 from core.llms.llm import LLM
 from core.providers.provider import Provider
 from models.phase import ChatPhase, Message, PromptPhase
+from utils.events import emit_event
 
 MAX_HELPS = 2
 
+INVALID_COMMANDS_TEMPLATE = "Failed to parse commands after `{c}`: `{t}: {e}`."
+
 
 async def generate(
     request: Message,
@@ -33,15 +37,28 @@ async def generate(
 
         prompt_phase.prompts.append(prompt)
         messages = [prompt]
-        commands = None
 
-        while not commands and len(messages) < MAX_HELPS:
+        while not prompt_phase.execution and len(messages) < MAX_HELPS:
+            parser = CommandStreamParser()
+            commands: asyncio.Queue = asyncio.Queue()
+            execution_task = asyncio.create_task(
+                execute(iter_queue(commands), provider)
+            )
+
             try:
                 start = time.time()
-                answer = await llm(messages)
+                await stream_commands(
+                    llm.stream(messages), parser, commands, execution_task
+                )
                 end = time.time()
 
+                if execution_task.done():
+                    answer = parser.parsed_text
+                else:
+                    answer = parser.text
+
                 duration = end - start
+                emit_event("answer", answer=answer, duration=duration)
 
                 prompt_phase.durations.append(duration)
                 prompt_phase.answers.append(answer)
@@ -49,22 +66,74 @@ async def generate(
                 messages.append(answer)
             except Exception:
                 prompt_phase.tracebacks.append(traceback.format_exc())
+                commands.put_nowait(None)
+                execution = await execution_task
+                prompt_phase.execution = execution if execution.commands else None
                 break
 
+            close_error = None
+
             try:
-                _, commands = extract_thinking_commands(prompt_phase.answers[-1])
-            except Exception:
+                if not execution_task.done():
+                    for command in parser.close():
+                        commands.put_nowait(command)
+            except Exception as e:
+                close_error = e
                 prompt_phase.tracebacks.append(traceback.format_exc())
-                prompt_phase.prompts.append(HELPER_PROMPT)
-                messages.append(HELPER_PROMPT)
-
-        if not commands:
+                if not parser.parsed_text:
+                    prompt_phase.prompts.append(HELPER_PROMPT)
+                    messages.append(HELPER_PROMPT)
+            finally:
+                commands.put_nowait(None)
+
+            execution = await execution_task
+            if (
+                close_error
+                and execution.commands
+                and execution.feedback.type == "info"
+                and not execution.response
+            ):
+                feedback_text = INVALID_COMMANDS_TEMPLATE.format(
+                    c=execution.commands[-1],
+                    t=type(close_error).__name__,
+                    e=close_error,
+                )
+                execution.feedback = Message(
+                    src="system", type="error", text=feedback_text
+                )
+
+            prompt_phase.execution = execution if execution.commands else None
+
+        if not prompt_phase.execution:
             break
 
-        prompt_phase.execution = await execute(commands, provider)
-
         if prompt_phase.execution.response:
             new_phase.response = prompt_phase.execution.response
             break
 
     return new_phase
+
+
+async def stream_commands(
+    stream: AsyncIterator[str],
+    parser: CommandStreamParser,
+    commands: asyncio.Queue,
+    execution_task: asyncio.Task,
+) -> None:
+    try:
+        async for chunk in stream:
+            emit_event("answer_chunk", text=chunk)
+
+            for command in parser.feed(chunk):
+                commands.put_nowait(command)
+
+            if parser.done or execution_task.done():
+                break
+
+    finally:
+        await stream.aclose()
+
+
+async def iter_queue(queue: asyncio.Queue) -> AsyncIterator[str]:
+    while (item := await queue.get()) is not None:
+        yield item
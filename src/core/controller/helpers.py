@@ -1,5 +1,6 @@
 import ast
-from typing import List, Tuple
+import textwrap
+from typing import List, Optional, Tuple
 
 
 def extract_thinking_commands(text: str) -> Tuple[str, List[str]]:
@@ -19,3 +20,100 @@ def parse_program(program_str: str) -> List[str]:
         code = ast.unparse(node)
         blocks.append(code)
     return blocks
+
+
+COMMANDS_MARKER = "COMMANDS:"
+SECTION_MARKERS = ("OBSERVATION:", "THINKING:", COMMANDS_MARKER)
+COMPOUND_STATEMENTS = (
+    ast.If,
+    ast.For,
+    ast.AsyncFor,
+    ast.While,
+    ast.With,
+    ast.AsyncWith,
+    ast.Try,
+    ast.FunctionDef,
+    ast.AsyncFunctionDef,
+    ast.ClassDef,
+    ast.Match,
+)
+
+
+class CommandStreamParser:
+    def __init__(self) -> None:
+        self.text = ""
+        self._start: Optional[int] = None
+        self._end: Optional[int] = None
+        self._parsed_end = 0
+        self._commands: List[str] = []
+        self._commands_end = 0
+
+    @property
+    def done(self) -> bool:
+        return self._end is not None
+
+    @property
+    def parsed_text(self) -> str:
+        return self.text[: self._commands_end]
+
+    def feed(self, chunk: str) -> List[str]:
+        self.text += chunk
+
+        if self._start is None:
+            index = self.text.find(COMMANDS_MARKER)
+            if index < 0:
+                return []
+
+            self._start = index + len(COMMANDS_MARKER)
+
+        if self._end is None:
+            self._end = self._find_section_end()
+
+        if self.done:
+            return self._parse(self._end, final=True)
+
+        return self._parse(self.text.rfind("\n") + 1, final=False)
+
+    def close(self) -> List[str]:
+        if self._start is None:
+            raise ValueError("Answer has no COMMANDS section")
+
+        if self._end is None:
+            self._end = len(self.text)
+
+        return self._parse(self._end, final=True)
+
+    def _find_section_end(self) -> Optional[int]:
+        indices = [self.text.find(marker, self._start) for marker in SECTION_MARKERS]
+        indices = [index for index in indices if index >= 0]
+        return min(indices) if indices else None
+
+    def _parse(self, end: int, final: bool) -> List[str]:
+        if end <= self._start or (end == self._parsed_end and not final):
+            return []
+
+        self._parsed_end = end
+        section = self.text[self._start : end]
+        prefix = section[: len(section) - len(section.lstrip())]
+        offset = self._start + (prefix.rfind("\n") + 1 or len(prefix))
+        section = self.text[offset:end]
+
+        try:
+            nodes = ast.parse(textwrap.dedent(section)).body
+        except SyntaxError:
+            if final:
+                raise
+            return []
+
+        if not final and nodes and isinstance(nodes[-1], COMPOUND_STATEMENTS):
+            nodes = nodes[:-1]
+
+        new_nodes = nodes[len(self._commands) :]
+        if not new_nodes:
+            return []
+
+        lines = section.splitlines(keepends=True)
+        self._commands_end = offset + sum(map(len, lines[: nodes[-1].end_lineno]))
+        new_commands = [ast.unparse(node) for node in new_nodes]
+        self._commands.extend(new_commands)
+        return new_commands
@@ -1,5 +1,4 @@
-import os
-from typing import Iterable, Optional
+from typing import AsyncIterator, Iterable, Optional
 
 import google.generativeai as genai
 from google.generativeai import GenerationConfig
@@ -38,7 +37,6 @@ class GoogleLLM(LLM):
         top_k: Optional[int] = None,
         top_p: Optional[int] = None,
     ) -> None:
-        genai.configure(api_key=os.environ["GOOGLE_API_KEY"])
         self._generation_config = GenerationConfig(
             stop_sequences=stop_words,
             max_output_tokens=max_out_tokens,
@@ -53,6 +51,23 @@ class GoogleLLM(LLM):
         )
 
     async def __call__(self, messages: Iterable[str]) -> str:
+        chat_session = self._start_chat(messages)
+        response = await chat_session.send_message_async(
+            messages[-1], safety_settings=SAFETY_SETTINGS
+        )
+
+        return response.text
+
+    async def stream(self, messages: Iterable[str]) -> AsyncIterator[str]:
+        chat_session = self._start_chat(messages)
+        response = await chat_session.send_message_async(
+            messages[-1], safety_settings=SAFETY_SETTINGS, stream=True
+        )
+
+        async for chunk in response:
+            yield chunk.text
+
+    def _start_chat(self, messages: Iterable[str]) -> genai.ChatSession:
         if len(messages) % 2 == 0:
             raise ValueError("Messages length must be odd")
 
@@ -61,9 +76,4 @@ class GoogleLLM(LLM):
             for i, message in enumerate(messages[:-1])
         ]
 
-        chat_session = self._model.start_chat(history=history)
-        response = await chat_session.send_message_async(
-            messages[-1], safety_settings=SAFETY_SETTINGS
-        )
-
-        return response.text
+        return self._model.start_chat(history=history)
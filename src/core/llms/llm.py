@@ -1,8 +1,11 @@
 from abc import ABC, abstractmethod
-from typing import Iterable
+from typing import AsyncIterator, Iterable
 
 
 class LLM(ABC):
     @abstractmethod
     async def __call__(self, messages: Iterable[str]) -> str:
         pass
+
+    async def stream(self, messages: Iterable[str]) -> AsyncIterator[str]:
+        yield await self(messages)
@@ -1,6 +1,7 @@
 import os
-from typing import Iterable, List, Optional
+from typing import Any, AsyncIterator, Iterable, List, Optional
 
+import aiohttp
 import openai
 
 from core.llms.llm import LLM
@@ -18,6 +19,7 @@ class OpenAILLM(LLM):
         max_out_tokens: Optional[int] = None,
         temperature: Optional[float] = None,
         top_p: Optional[int] = None,
+        session: Optional[aiohttp.ClientSession] = None,
     ) -> None:
         self.model_name = model_name
         self.system_message = system_message
@@ -25,21 +27,38 @@ class OpenAILLM(LLM):
         self.max_out_tokens = max_out_tokens
         self.temperature = temperature
         self.top_p = top_p
+        self.session = session
 
     async def __call__(self, messages: List[str]) -> str:
+        response = await self._create_completion(messages, stream=False)
+        return response.choices[0].message.content
+
+    async def stream(self, messages: List[str]) -> AsyncIterator[str]:
+        response = await self._create_completion(messages, stream=True)
+
+        async for chunk in response:
+            if content := chunk.choices[0].delta.get("content"):
+                yield content
+
+    async def _create_completion(self, messages: List[str], stream: bool) -> Any:
         if len(messages) % 2 == 0:
             raise ValueError("Messages length must be odd")
 
         input_messages = self._create_input_messages(messages)
-        response = await openai.ChatCompletion.acreate(
-            messages=input_messages,
-            model=self.model_name,
-            max_tokens=self.max_out_tokens,
-            stop=self.stop_words,
-            top_p=self.top_p,
-        )
+        token = openai.aiosession.set(self.session) if self.session else None
 
-        return response.choices[0].message.content
+        try:
+            return await openai.ChatCompletion.acreate(
+                messages=input_messages,
+                model=self.model_name,
+                max_tokens=self.max_out_tokens,
+                stop=self.stop_words,
+                top_p=self.top_p,
+                stream=stream,
+            )
+        finally:
+            if token:
+                openai.aiosession.reset(token)
 
     def _create_input_messages(self, messages: Iterable[str]) -> List[str]:
         input_messages = []
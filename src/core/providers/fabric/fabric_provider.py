@@ -1,7 +1,5 @@
-import base64 as b64
 import io
-from copy import deepcopy
-from typing import Any, List, Literal, Optional, Tuple, TypeVar, Union
+from typing import Any, Iterator, List, Literal, Optional, Tuple, TypeVar, Union
 from uuid import uuid4
 
 import PIL
@@ -15,6 +13,7 @@ from core.providers.fabric.models import (
     FabricRect,
     FabricTextbox,
 )
+from core.providers.fabric.models.fabric_canvas import materialize_canvases
 from core.providers.fabric.models.fabric_filter import (
     BlurFilter,
     BrightnessFilter,
@@ -26,7 +25,12 @@ from core.providers.fabric.models.fabric_filter import (
     SaturationFilter,
 )
 from core.providers.fabric.models.fabric_group import FabricGroup
-from core.providers.provider import Provider, prompt_function
+from core.providers.provider import (
+    MaterializationError,
+    Provider,
+    prompt_function,
+)
+from lib.blobs import get_blob, put_blob
 from models.phase import Message
 from schemas.file import File
 
@@ -94,17 +98,20 @@ class FabricProvider(Provider):
 
     def convert_file_to_objects(self, file: File) -> List[Any]:
         if file.content_type.startswith("image/"):
-            base64 = b64.b64encode(file.buffer).decode()
-            data_url = f"data:{file.content_type};base64,{base64}"
-            image = PIL.Image.open(io.BytesIO(file.buffer))
-            width, height = image.size
+            src = file.ref or put_blob(file.buffer, file.content_type)
+            width, height = file.width, file.height
+            if width is None or height is None:
+                buffer = get_blob(src)[0] if file.ref else file.buffer
+                width, height = PIL.Image.open(io.BytesIO(buffer)).size
+
             background_image = FabricImage(
-                src=data_url, filename=file.name, width=width, height=height
+                src=src, filename=file.name, width=width, height=height
             )
             return [FabricCanvas(backgroundImage=background_image)]
 
         elif file.name.endswith(".fcanvas"):
-            canvas = FabricCanvas.model_validate_json(file.buffer)
+            buffer = get_blob(file.ref)[0] if file.ref else file.buffer
+            canvas = FabricCanvas.model_validate_json(buffer)
             is_query_rect = lambda x: isinstance(x, FabricRect) and x.is_query
             query_rects = [obj for obj in canvas.objects if is_query_rect(obj)]
             [canvas.objects.remove(rect) for rect in query_rects]
@@ -112,9 +119,37 @@ class FabricProvider(Provider):
 
         raise NotImplementedError()
 
+    async def materialize_context(self) -> None:
+        context = self.get_context()
+        canvases = [
+            canvas
+            for _, v in context.get_loaded_items()
+            for canvas in iter_values(v, FabricCanvas)
+        ]
+
+        try:
+            await materialize_canvases(canvases)
+
+        except Exception as e:
+            varnames = []
+            pending_ids = set()
+
+            for k, v in context.get_loaded_items():
+                for canvas in iter_values(v, FabricCanvas):
+                    if pending := canvas.get_pending_inpainting():
+                        varnames.append(k)
+                        pending_ids.update(obj.id for obj in pending)
+
+            for _, v in context.get_loaded_items():
+                for obj in iter_values(v, FabricImage):
+                    if obj.id in pending_ids:
+                        obj.inpainted = False
+
+            raise MaterializationError(list(dict.fromkeys(varnames)), e) from e
+
     def convert_object_to_file(self, obj: Any) -> File:
         if isinstance(obj, FabricCanvas):
-            buffer = obj.model_dump_json().encode()
+            buffer = obj.model_dump_json(context={"embed_blobs": True}).encode()
             filename = obj.backgroundImage.filename + ".fcanvas"
             return File(
                 buffer=buffer,
@@ -123,10 +158,9 @@ class FabricProvider(Provider):
             )
 
         elif isinstance(obj, FabricImage):
-            obj.left = 0
-            obj.top = 0
-            canvas = FabricCanvas(backgroundImage=obj)
-            buffer = canvas.model_dump_json().encode()
+            background_image = obj.model_copy(update={"left": 0, "top": 0})
+            canvas = FabricCanvas(backgroundImage=background_image)
+            buffer = canvas.model_dump_json(context={"embed_blobs": True}).encode()
             filename = (obj.filename or f"{uuid4()}.png") + ".fcanvas"
             return File(
                 buffer=buffer,
@@ -180,7 +214,7 @@ class FabricProvider(Provider):
     async def replace_image_objects_by_prompt(
         self, image: CompositeImage, objects: List[ImageObject], prompt: str
     ) -> CompositeImage:
-        copied_image = deepcopy(image)
+        copied_image = image.clone()
         await copied_image.replace_objects_by_prompt(objects, prompt)
         return copied_image
 
@@ -212,7 +246,7 @@ class FabricProvider(Provider):
             return None
 
         filt = self._create_filter(filter_name, filter_value)
-        copied_image = deepcopy(image)
+        copied_image = image.clone()
         copied_image.apply_filter(filt, children)
         return copied_image
 
@@ -226,13 +260,13 @@ class FabricProvider(Provider):
         angle: float,
         children: Optional[List[CANVAS_OBJECT_TYPE]] = None,
     ) -> CompositeImage:
-        copied_image = deepcopy(image)
+        copied_image = image.clone()
 
         if children:
             angles = [angle] * len(children)
             await copied_image.rotate_objects(children, angles)
         else:
-            copied_image.backgroundImage.rotate(angle)
+            copied_image.rotate_background(angle)
 
         return copied_image
 
@@ -246,13 +280,13 @@ class FabricProvider(Provider):
         axis: Literal["x", "y"],
         children: Optional[List[CANVAS_OBJECT_TYPE]] = None,
     ) -> CompositeImage:
-        copied_image = deepcopy(image)
+        copied_image = image.clone()
 
         if children:
             axes = [axis] * len(children)
             await copied_image.flip_objects(children, axes)
         else:
-            copied_image.backgroundImage.flip(axis)
+            copied_image.flip_background(axis)
 
         return copied_image
 
@@ -265,7 +299,7 @@ class FabricProvider(Provider):
         image: CompositeImage,
         children: List[CANVAS_OBJECT_TYPE],
     ) -> CompositeImage:
-        copied_image = deepcopy(image)
+        copied_image = image.clone()
 
         for obj in children:
             if isinstance(obj, FabricTextbox) and obj.fontSize == "default":
@@ -283,7 +317,7 @@ class FabricProvider(Provider):
         image: CompositeImage,
         children: List[CANVAS_OBJECT_TYPE],
     ) -> CompositeImage:
-        copied_image = deepcopy(image)
+        copied_image = image.clone()
         await copied_image.remove_objects(children)
         return copied_image
 
@@ -306,7 +340,7 @@ class FabricProvider(Provider):
             self._set_feedback("error", feedback_text)
             return None
 
-        copied_image = deepcopy(image)
+        copied_image = image.clone()
         await copied_image.move_objects(children, destinations)
         return copied_image
 
@@ -329,7 +363,7 @@ class FabricProvider(Provider):
             self._set_feedback("error", feedback_text)
             return None
 
-        copied_image = deepcopy(image)
+        copied_image = image.clone()
         await copied_image.scale_objects(children, factors)
         return copied_image
 
@@ -371,8 +405,7 @@ class FabricProvider(Provider):
     async def response_to_user(
         self, text: str, attachments: List[Union[CompositeImage, ImageObject]] = []
     ) -> None:
-        id_to_varname = {id(v): k for k, v in self._context.items()}
-        varnames = [id_to_varname[id(att)] for att in attachments]
+        varnames = [self.get_varname(att) for att in attachments]
         self._response = Message(
             src="llm", type="response", text=text, varnames=varnames
         )
@@ -380,7 +413,7 @@ class FabricProvider(Provider):
     def _annotate_detections(
         self, canvas: FabricCanvas, objects: List[FabricImage]
     ) -> FabricCanvas:
-        copied_canvas = deepcopy(canvas)
+        copied_canvas = canvas.clone()
 
         box_stroke_width = canvas.backgroundImage.height // 100
         idx_font_size = canvas.backgroundImage.height // 10
@@ -429,3 +462,16 @@ class FabricProvider(Provider):
             return GrayscaleFilter()
         if filter_name == "Invert":
             return InvertFilter()
+
+
+def iter_values(value: Any, value_type: type) -> Iterator[Any]:
+    if isinstance(value, value_type):
+        yield value
+
+    elif isinstance(value, FabricCanvas):
+        for obj in value.objects:
+            yield from iter_values(obj, value_type)
+
+    elif isinstance(value, list):
+        for item in value:
+            yield from iter_values(item, value_type)
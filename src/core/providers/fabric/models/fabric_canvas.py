@@ -1,13 +1,15 @@
+import asyncio
 import io
 import json
-import zipfile
-from typing import Any, List, Literal, Optional, Tuple, Union
+from collections import defaultdict
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Tuple, Union
 
 import aiohttp
+import numpy as np
 import PIL
 import PIL.Image
 from PIL.Image import Image
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 
 from core.providers.fabric.models.fabric_filter import FabricFilter
 from core.providers.fabric.models.fabric_group import FabricGroup
@@ -15,8 +17,29 @@ from core.providers.fabric.models.fabric_image import FabricImage
 from core.providers.fabric.models.fabric_object import FabricObject
 from core.providers.fabric.models.fabric_rect import FabricRect
 from core.providers.fabric.models.fabric_textbox import FabricTextbox
-from utils.convert import image_to_buffer, image_to_data_url, image_to_mask
+from lib.ml_cache import (
+    create_ml_cache_key,
+    get_ml_result,
+    get_ml_stream,
+    put_ml_result,
+    put_ml_stream,
+)
+from lib.ml_client import MLServiceError, ml_client
+from utils.cache import LRUCache
+from utils.convert import image_to_buffer
 from utils.env import ENV
+from utils.executor import run_in_executor
+from utils.mask import (
+    Box,
+    cut_out,
+    get_mask_box,
+    image_to_alpha_array,
+    image_to_mask_array,
+    image_to_rgb_array,
+    mask_array_to_image,
+    paste_mask,
+)
+from utils.zip_stream import iter_zip_stream
 
 GROUNDED_SAM_ENDPOINT = (
     f"{ENV.ML_SERVICE_API_BASE_URL}/api/v{ENV.ML_SERVICE_API_VERSION}/grounded-sam"
@@ -26,6 +49,9 @@ LAMA_ENDPOINT = f"{ENV.ML_SERVICE_API_BASE_URL}/api/v{ENV.ML_SERVICE_API_VERSION
 SD_INPAINT_ENDPOINT = (
     f"{ENV.ML_SERVICE_API_BASE_URL}/api/v{ENV.ML_SERVICE_API_VERSION}/sd-inpaint"
 )
+INFERENCE_IMAGE_CACHE_MAX_SIZE = 128 * 1024 * 1024
+
+inference_image_cache = LRUCache(INFERENCE_IMAGE_CACHE_MAX_SIZE)
 
 
 class FabricCanvas(BaseModel):
@@ -33,133 +59,97 @@ class FabricCanvas(BaseModel):
     objects: List[Union[FabricImage, FabricTextbox, FabricRect, FabricGroup]] = Field(
         default_factory=list
     )
+    _pending_inpainting: List[FabricImage] = PrivateAttr(default_factory=list)
 
     async def segment_image_objects_by_prompt(self, prompt: str) -> List[FabricImage]:
-        image = self.backgroundImage.to_image()
-        buffer = image_to_buffer(image)
-
-        form_data = aiohttp.FormData()
-        form_data.add_field("image", buffer)
-        form_data.add_field("prompt", prompt)
-
-        async with aiohttp.ClientSession() as session:
-            async with session.post(GROUNDED_SAM_ENDPOINT, data=form_data) as response:
-                if response.status != 200:
-                    raise Exception(f"Failed to request object-segmentation model")
-
-                scores: List[float] = []
-                masks: List[Image] = []
-                zip_bytes = await response.read()
-
-                with zipfile.ZipFile(io.BytesIO(zip_bytes)) as z:
-                    for file_info in z.infolist():
-                        score = float(file_info.filename.split(".")[0])
-                        scores.append(score)
-                        with z.open(file_info) as file:
-                            mask = PIL.Image.open(file)
-                            mask.load()
-                            masks.append(mask)
-
-        objects = []
-
-        for score, mask in zip(scores, masks):
-            obj_box = mask.getbbox()
-            obj_mask = mask.crop(obj_box)
-            obj_image = PIL.Image.new("RGBA", obj_mask.size)
-            obj_image.paste(image.crop(obj_box), mask=obj_mask)
-            data_url = image_to_data_url(obj_image)
-            obj = FabricImage(
-                src=data_url,
-                left=obj_box[0],
-                top=obj_box[1],
-                width=obj_image.width,
-                height=obj_image.height,
-                label_to_score={prompt: score},
-                inpainted=False,
-            )
-            self.objects.append(obj)
-            objects.append(obj)
-
+        await self.materialize()
+        image = await run_in_executor(self.backgroundImage.to_image)
+        buffer, _ = await run_in_executor(
+            get_inference_buffer, self.backgroundImage.src, image, (0, 0, *image.size)
+        )
+
+        chunks = stream_ml(
+            GROUNDED_SAM_ENDPOINT,
+            {"image": buffer},
+            {"prompt": prompt},
+            "object-segmentation",
+        )
+        objects = await create_image_objects(chunks, image, prompt)
+        self.objects.extend(objects)
         return objects
 
     async def segment_image_objects_by_boxes(
         self, boxes: List[Tuple[int, int, int, int]]
     ) -> List[FabricImage]:
-        image = self.backgroundImage.to_image()
-        buffer = image_to_buffer(image)
-
-        form_data = aiohttp.FormData()
-        form_data.add_field("image", buffer)
-        form_data.add_field("boxes", json.dumps(boxes))
-
-        async with aiohttp.ClientSession() as session:
-            async with session.post(SAM2_ENDPOINT, data=form_data) as response:
-                if response.status != 200:
-                    raise Exception(f"Failed to request object-segmentation model")
-
-                masks: List[Image] = []
-                zip_bytes = await response.read()
-
-                with zipfile.ZipFile(io.BytesIO(zip_bytes)) as z:
-                    for file_info in z.infolist():
-                        with z.open(file_info) as file:
-                            mask = PIL.Image.open(file)
-                            mask.load()
-                            masks.append(mask)
-
-        objects = []
-
-        for mask in masks:
-            obj_box = mask.getbbox()
-            obj_mask = mask.crop(obj_box)
-            obj_image = PIL.Image.new("RGBA", obj_mask.size)
-            obj_image.paste(image.crop(obj_box), mask=obj_mask)
-            data_url = image_to_data_url(obj_image)
-            obj = FabricImage(
-                src=data_url,
-                left=obj_box[0],
-                top=obj_box[1],
-                width=obj_image.width,
-                height=obj_image.height,
-                inpainted=False,
+        if not boxes:
+            return []
+
+        await self.materialize()
+        image = await run_in_executor(self.backgroundImage.to_image)
+        roi_box = expand_box(get_union_box(boxes), get_roi_margin(image), image.size)
+        left, top, _, _ = roi_box
+        tile = await run_in_executor(image.crop, roi_box)
+        buffer, (inference_width, _) = await run_in_executor(
+            get_inference_buffer, self.backgroundImage.src, image, roi_box
+        )
+        scale = inference_width / tile.width
+        tile_boxes = [
+            (
+                round((x0 - left) * scale),
+                round((y0 - top) * scale),
+                round((x1 - left) * scale),
+                round((y1 - top) * scale),
             )
-            self.objects.append(obj)
-            objects.append(obj)
+            for x0, y0, x1, y1 in boxes
+        ]
+
+        chunks = stream_ml(
+            SAM2_ENDPOINT,
+            {"image": buffer},
+            {"boxes": json.dumps(tile_boxes)},
+            "object-segmentation",
+        )
+        objects = await create_image_objects(chunks, tile)
 
+        for obj in objects:
+            obj.left += left
+            obj.top += top
+
+        self.objects.extend(objects)
         return objects
 
     async def inpaint_image_objects(self, objects: List[FabricImage]) -> None:
-        if not objects:
-            return
-
-        image = self.backgroundImage.to_image()
-        mask = PIL.Image.new("L", image.size)
+        self.defer_inpainting(objects)
+        await self.materialize()
 
+    def defer_inpainting(self, objects: List[FabricImage]) -> None:
         for obj in objects:
-            obj_image = obj.to_image()
-            obj_mask = image_to_mask(obj_image)
-            mask.paste(obj_mask, obj.get_box(), obj_mask)
+            self._pending_inpainting.append(obj.model_copy())
+            obj.inpainted = True
 
-        image_buffer = image_to_buffer(image)
-        mask_buffer = image_to_buffer(mask)
+    async def materialize(self) -> None:
+        if not self._pending_inpainting:
+            return
 
-        form_data = aiohttp.FormData()
-        form_data.add_field("image", image_buffer)
-        form_data.add_field("mask", mask_buffer)
+        objects = self._pending_inpainting
+        self._pending_inpainting = []
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(LAMA_ENDPOINT, data=form_data) as response:
-                if response.status != 200:
-                    raise Exception(f"Failed to request image-inpainting model")
+        try:
+            await self._inpaint_background(objects, LAMA_ENDPOINT)
+        except Exception:
+            self._pending_inpainting = objects + self._pending_inpainting
+            raise
 
-                response_buffer = await response.read()
-                inpainted_image = PIL.Image.open(io.BytesIO(response_buffer))
-                inpainted_image.load()
+    def get_pending_inpainting(self) -> List[FabricImage]:
+        return list(self._pending_inpainting)
 
-        for obj in objects:
-            obj.inpainted = True
-
-        self.backgroundImage.set_image(inpainted_image)
+    def is_covering(self, objects: List[FabricImage]) -> bool:
+        pending_ids = set(obj.id for obj in self._pending_inpainting)
+        boxes = {obj.id: obj.get_box() for obj in self.objects}
+        return all(
+            obj.id in pending_ids or boxes.get(obj.id) == obj.get_box()
+            for obj in objects
+        )
 
     async def inpaint_image_objects_by_prompt(
         self, objects: List[FabricImage], prompt: str
@@ -167,35 +157,22 @@ class FabricCanvas(BaseModel):
         if not objects:
             return
 
-        image = self.backgroundImage.to_image()
-        mask = PIL.Image.new("L", image.size)
+        await self.materialize()
+        await self._inpaint_background(objects, SD_INPAINT_ENDPOINT, prompt=prompt)
 
         for obj in objects:
-            obj_image = obj.to_image()
-            obj_mask = image_to_mask(obj_image)
-            mask.paste(obj_mask, obj.get_box(), obj_mask)
-
-        image_buffer = image_to_buffer(image)
-        mask_buffer = image_to_buffer(mask)
-
-        form_data = aiohttp.FormData()
-        form_data.add_field("image", image_buffer)
-        form_data.add_field("mask", mask_buffer)
-        form_data.add_field("prompt", prompt)
-
-        async with aiohttp.ClientSession() as session:
-            async with session.post(SD_INPAINT_ENDPOINT, data=form_data) as response:
-                if response.status != 200:
-                    raise Exception(f"Failed to request image-inpainting model")
+            obj.inpainted = True
 
-                response_buffer = await response.read()
-                inpainted_image = PIL.Image.open(io.BytesIO(response_buffer))
-                inpainted_image.load()
+    def clone(self) -> "FabricCanvas":
+        canvas = self.model_copy(update={"objects": list(self.objects)})
+        canvas._pending_inpainting = list(self._pending_inpainting)
+        return canvas
 
-        for obj in objects:
-            obj.inpainted = True
+    def rotate_background(self, angle: float) -> None:
+        self._clone_background().rotate(angle)
 
-        self.backgroundImage.set_image(inpainted_image)
+    def flip_background(self, axis: Literal["x", "y"]) -> None:
+        self._clone_background().flip(axis)
 
     async def insert_objects(self, objects: List[FabricObject]) -> None:
         self.objects.extend(objects)
@@ -210,7 +187,7 @@ class FabricCanvas(BaseModel):
 
     async def remove_objects(self, objects: List[FabricObject]) -> None:
         uninpainted_objects = self._get_uninpainted_image_objects(objects)
-        await self.inpaint_image_objects(uninpainted_objects)
+        self.defer_inpainting(uninpainted_objects)
         ids_to_remove = set(obj.id for obj in objects)
         self.objects = [obj for obj in self.objects if obj.id not in ids_to_remove]
 
@@ -218,53 +195,79 @@ class FabricCanvas(BaseModel):
         self, objects: List[FabricObject], axes: List[Literal["x", "y"]]
     ) -> None:
         uninpainted_objects = self._get_uninpainted_image_objects(objects)
-        await self.inpaint_image_objects(uninpainted_objects)
+        self.defer_inpainting(uninpainted_objects)
         for i in self._get_object_indexes(objects):
-            self.objects[i].flip(axes.pop())
+            self._clone_object(i).flip(axes.pop())
 
     async def move_objects(
         self, objects: List[FabricObject], destinations: List[Tuple[int, int]]
     ) -> None:
         uninpainted_objects = self._get_uninpainted_image_objects(objects)
-        await self.inpaint_image_objects(uninpainted_objects)
+        self.defer_inpainting(uninpainted_objects)
         for i in self._get_object_indexes(objects):
-            self.objects[i].move(destinations.pop())
+            self._clone_object(i).move(destinations.pop())
 
     async def shift_objects(
         self, objects: List[FabricObject], offsets: List[Tuple[int, int]]
     ) -> None:
         uninpainted_objects = self._get_uninpainted_image_objects(objects)
-        await self.inpaint_image_objects(uninpainted_objects)
+        self.defer_inpainting(uninpainted_objects)
         for i in self._get_object_indexes(objects):
-            self.objects[i].shift(offsets.pop())
+            self._clone_object(i).shift(offsets.pop())
 
     async def rotate_objects(
         self, objects: List[FabricObject], angles: List[float]
     ) -> None:
         uninpainted_objects = self._get_uninpainted_image_objects(objects)
-        await self.inpaint_image_objects(uninpainted_objects)
+        self.defer_inpainting(uninpainted_objects)
         for i in self._get_object_indexes(objects):
-            self.objects[i].rotate(angles.pop())
+            self._clone_object(i).rotate(angles.pop())
 
     async def scale_objects(
         self, objects: List[FabricObject], factors: List[float]
     ) -> None:
         uninpainted_objects = self._get_uninpainted_image_objects(objects)
-        await self.inpaint_image_objects(uninpainted_objects)
+        self.defer_inpainting(uninpainted_objects)
         for i in self._get_object_indexes(objects):
-            self.objects[i].scale(factors[i])
+            self._clone_object(i).scale(factors[i])
 
     def apply_filter(
         self, filt: FabricFilter, objects: Optional[List[FabricImage]] = None
     ) -> None:
         if objects:
             for i in self._get_object_indexes(objects):
-                self.objects[i].apply_filter(filt)
+                self._clone_object(i).apply_filter(filt)
         else:
-            self.backgroundImage.apply_filter(filt)
-            for obj in self.objects:
+            self._clone_background().apply_filter(filt)
+            for i, obj in enumerate(self.objects):
                 if isinstance(obj, FabricImage):
-                    obj.apply_filter(filt)
+                    self._clone_object(i).apply_filter(filt)
+
+    async def _inpaint_background(
+        self, objects: List[FabricImage], endpoint: str, **fields: str
+    ) -> None:
+        image = await run_in_executor(self.backgroundImage.to_image)
+        mask = await run_in_executor(create_objects_mask, image.size, objects)
+        roi = await run_in_executor(crop_roi, image, mask, get_roi_margin(image))
+        if not roi:
+            return
+
+        box, tile, tile_mask = roi
+        tile_buffer = await run_in_executor(image_to_buffer, tile)
+        tile_mask_buffer = await run_in_executor(image_to_buffer, tile_mask)
+
+        response_buffer = await request_ml(
+            endpoint,
+            {"image": tile_buffer.getvalue(), "mask": tile_mask_buffer.getvalue()},
+            fields,
+            "image-inpainting",
+        )
+
+        inpainted_tile = await run_in_executor(load_image, response_buffer)
+        inpainted_image = await run_in_executor(
+            paste_roi, image, box, tile_mask, inpainted_tile
+        )
+        await run_in_executor(self._clone_background().set_image, inpainted_image)
 
     def _get_uninpainted_image_objects(
         self, objects: List[FabricObject]
@@ -275,5 +278,238 @@ class FabricCanvas(BaseModel):
             if isinstance(obj, FabricImage) and obj.inpainted == False
         ]
 
+    def _clone_object(self, index: int) -> FabricObject:
+        self.objects[index] = self.objects[index].clone()
+        return self.objects[index]
+
+    def _clone_background(self) -> FabricImage:
+        self.backgroundImage = self.backgroundImage.clone()
+        return self.backgroundImage
+
     def _get_object_indexes(self, objects: List[FabricObject]) -> List[int]:
         return [self.objects.index(obj) for obj in objects]
+
+
+async def materialize_canvases(canvases: List[FabricCanvas]) -> None:
+    src_to_canvases: Dict[str, List[FabricCanvas]] = defaultdict(list)
+
+    for canvas in {id(canvas): canvas for canvas in canvases}.values():
+        if canvas._pending_inpainting:
+            src_to_canvases[canvas.backgroundImage.src].append(canvas)
+
+    results = await asyncio.gather(
+        *(materialize_shared_background(group) for group in src_to_canvases.values()),
+        return_exceptions=True,
+    )
+
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+
+
+async def materialize_shared_background(canvases: List[FabricCanvas]) -> None:
+    objects = list(
+        {obj.id: obj for c in canvases for obj in c._pending_inpainting}.values()
+    )
+    covering = [canvas.is_covering(objects) for canvas in canvases]
+    shared = [canvas for canvas, flag in zip(canvases, covering) if flag]
+    others = [canvas for canvas, flag in zip(canvases, covering) if not flag]
+
+    if shared:
+        first = shared[0]
+        first._pending_inpainting = objects
+        await first.materialize()
+
+        for canvas in shared[1:]:
+            canvas._pending_inpainting = []
+            canvas.backgroundImage = canvas.backgroundImage.model_copy(
+                update={
+                    "src": first.backgroundImage.src,
+                    "width": first.backgroundImage.width,
+                    "height": first.backgroundImage.height,
+                }
+            )
+
+    for canvas in others:
+        await canvas.materialize()
+
+
+async def request_ml(
+    endpoint: str, files: Dict[str, bytes], fields: Dict[str, str], model_name: str
+) -> bytes:
+    key = create_ml_cache_key(endpoint, files, fields)
+    if buffer := await get_ml_result(key):
+        return buffer
+
+    try:
+        buffer = await ml_client.post(endpoint, create_form_data(files, fields))
+    except MLServiceError as e:
+        raise Exception(f"Failed to request {model_name} model") from e
+
+    await put_ml_result(key, buffer)
+    return buffer
+
+
+async def stream_ml(
+    endpoint: str, files: Dict[str, bytes], fields: Dict[str, str], model_name: str
+) -> AsyncIterator[bytes]:
+    key = create_ml_cache_key(endpoint, files, fields)
+    if cached := await get_ml_stream(key):
+        async for chunk in cached:
+            yield chunk
+        return
+
+    form_data = create_form_data(files, fields)
+    chunks = put_ml_stream(key, ml_client.stream_post(endpoint, form_data))
+
+    try:
+        async for chunk in chunks:
+            yield chunk
+    except MLServiceError as e:
+        raise Exception(f"Failed to request {model_name} model") from e
+
+
+def create_form_data(
+    files: Dict[str, bytes], fields: Dict[str, str]
+) -> aiohttp.FormData:
+    form_data = aiohttp.FormData()
+    for name, value in files.items():
+        form_data.add_field(name, value)
+    for name, value in fields.items():
+        form_data.add_field(name, value)
+
+    return form_data
+
+
+def load_image(buffer: bytes) -> Image:
+    image = PIL.Image.open(io.BytesIO(buffer))
+    image.load()
+    return image
+
+
+async def create_image_objects(
+    chunks: AsyncIterator[bytes], image: Image, prompt: Optional[str] = None
+) -> List[FabricImage]:
+    image_array = await run_in_executor(image_to_rgb_array, image)
+    tasks: List[asyncio.Future] = []
+
+    try:
+        async for filename, mask_buffer in iter_zip_stream(chunks):
+            if len(tasks) >= ENV.IMAGE_WORKERS:
+                await tasks[-ENV.IMAGE_WORKERS]
+
+            label_to_score = {prompt: float(filename.split(".")[0])} if prompt else None
+            task = asyncio.ensure_future(
+                run_in_executor(
+                    create_image_object, image_array, mask_buffer, label_to_score
+                )
+            )
+            tasks.append(task)
+
+        objects = await asyncio.gather(*tasks)
+
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    return [obj for obj in objects if obj]
+
+
+def create_image_object(
+    image_array: np.ndarray,
+    mask_buffer: bytes,
+    label_to_score: Optional[Dict[str, float]] = None,
+) -> Optional[FabricImage]:
+    height, width, _ = image_array.shape
+    mask = load_image(mask_buffer)
+    if mask.size != (width, height):
+        mask = mask.convert("L").resize((width, height), PIL.Image.Resampling.BILINEAR)
+
+    alpha = image_to_alpha_array(mask)
+    box = get_mask_box(alpha)
+    if box is None:
+        return None
+
+    return FabricImage.from_image(
+        cut_out(image_array, alpha, box),
+        left=box[0],
+        top=box[1],
+        label_to_score=label_to_score,
+        inpainted=False,
+    )
+
+
+def get_inference_buffer(
+    src: str, image: Image, box: Box
+) -> Tuple[bytes, Tuple[int, int]]:
+    key = (src, box, ENV.MAX_INFERENCE_SIZE)
+    if rendition := inference_image_cache.get(key):
+        return rendition
+
+    if box != (0, 0, *image.size):
+        image = image.crop(box)
+
+    if 0 < ENV.MAX_INFERENCE_SIZE < max(image.size):
+        scale = ENV.MAX_INFERENCE_SIZE / max(image.size)
+        size = (max(round(image.width * scale), 1), max(round(image.height * scale), 1))
+        image = image.resize(size, PIL.Image.Resampling.LANCZOS)
+
+    buffer = image_to_buffer(image).getvalue()
+    inference_image_cache.put(key, (buffer, image.size), len(buffer))
+    return buffer, image.size
+
+
+def create_objects_mask(size: Tuple[int, int], objects: List[FabricImage]) -> Image:
+    width, height = size
+    mask = np.zeros((height, width), dtype=bool)
+
+    for obj in objects:
+        left, top, _, _ = obj.get_box()
+        paste_mask(mask, image_to_mask_array(obj.to_image()), left, top)
+
+    return mask_array_to_image(mask)
+
+
+def get_roi_margin(image: Image) -> int:
+    return ENV.ROI_MARGIN if ENV.ROI_CROPPING else max(image.size)
+
+
+def crop_roi(
+    image: Image, mask: Image, margin: int
+) -> Optional[Tuple[Box, Image, Image]]:
+    mask_box = mask.getbbox()
+    if not mask_box:
+        return None
+
+    box = expand_box(mask_box, margin, image.size)
+    return box, image.crop(box), mask.crop(box)
+
+
+def paste_roi(image: Image, box: Box, tile_mask: Image, tile: Image) -> Image:
+    tile_size = (box[2] - box[0], box[3] - box[1])
+    if tile.size != tile_size:
+        tile = tile.resize(tile_size, PIL.Image.Resampling.LANCZOS)
+
+    result = image.copy()
+    result.paste(tile.convert(result.mode), box, tile_mask)
+    return result
+
+
+def get_union_box(boxes: List[Box]) -> Box:
+    return (
+        min(box[0] for box in boxes),
+        min(box[1] for box in boxes),
+        max(box[2] for box in boxes),
+        max(box[3] for box in boxes),
+    )
+
+
+def expand_box(box: Box, margin: int, size: Tuple[int, int]) -> Box:
+    left, top, right, bottom = box
+    return (
+        max(left - margin, 0),
+        max(top - margin, 0),
+        min(right + margin, size[0]),
+        min(bottom + margin, size[1]),
+    )
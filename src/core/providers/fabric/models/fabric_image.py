@@ -1,12 +1,24 @@
-from typing import Dict, List, Literal, Optional
+import io
+from typing import Any, Dict, List, Literal, Optional
 
 import PIL.Image
 from PIL.Image import Image
-from pydantic import Field
+from pydantic import Field, SerializationInfo, field_serializer, field_validator
 
 from core.providers.fabric.models.fabric_filter import AdjustableFilter, FabricFilter
 from core.providers.fabric.models.fabric_object import FabricObject
-from utils.convert import data_url_to_image, image_to_base64
+from lib.blobs import get_blob, is_blob_ref, put_blob
+from utils.cache import LRUCache
+from utils.convert import (
+    buffer_to_data_url,
+    data_url_to_buffer,
+    data_url_to_image,
+    image_to_buffer,
+)
+
+DECODED_IMAGE_CACHE_MAX_SIZE = 512 * 1024 * 1024
+
+decoded_image_cache = LRUCache(DECODED_IMAGE_CACHE_MAX_SIZE)
 
 
 class FabricImage(FabricObject):
@@ -19,6 +31,33 @@ class FabricImage(FabricObject):
     label_to_score: Optional[Dict[str, float]] = Field(default=None)
     inpainted: Optional[bool] = Field(default=None)
 
+    @classmethod
+    def from_image(cls, image: Image, **kwargs: Any) -> "FabricImage":
+        obj = cls(src="", **kwargs)
+        obj.set_image(image)
+        return obj
+
+    @field_validator("src")
+    @classmethod
+    def store_data_url(cls, src: str) -> str:
+        if not src.startswith("data:"):
+            return src
+
+        buffer, content_type = data_url_to_buffer(src)
+        return put_blob(buffer, content_type)
+
+    @field_serializer("src")
+    def embed_blob(self, src: str, info: SerializationInfo) -> str:
+        if info.context and info.context.get("embed_blobs") and is_blob_ref(src):
+            return buffer_to_data_url(*get_blob(src))
+
+        return src
+
+    def clone(self) -> "FabricImage":
+        return self.model_copy(
+            update={"filters": [filt.model_copy() for filt in self.filters]}
+        )
+
     def apply_filter(self, filt: FabricFilter) -> None:
         if isinstance(filt, AdjustableFilter):
             for curr_filt in self.filters:
@@ -31,12 +70,27 @@ class FabricImage(FabricObject):
             self.filters.append(filt)
 
     def set_image(self, image: Image) -> None:
-        image_format = image.format.lower() or "png"
-        base64 = image_to_base64(image)
-        mime_type = f"image/{image_format}"
-        self.src = f"data:{mime_type};base64,{base64}"
+        image_format = (image.format or "PNG").lower()
+        buffer = image_to_buffer(image).getvalue()
+        self.src = put_blob(buffer, f"image/{image_format}")
         self.width = image.width
         self.height = image.height
+        decoded_image_cache.put(self.src, image, get_image_size(image))
 
     def to_image(self) -> PIL.Image.Image:
-        return data_url_to_image(self.src)
+        if image := decoded_image_cache.get(self.src):
+            return image
+
+        if is_blob_ref(self.src):
+            buffer, _ = get_blob(self.src)
+            image = PIL.Image.open(io.BytesIO(buffer))
+        else:
+            image = data_url_to_image(self.src)
+
+        image.load()
+        decoded_image_cache.put(self.src, image, get_image_size(image))
+        return image
+
+
+def get_image_size(image: Image) -> int:
+    return image.width * image.height * len(image.getbands())
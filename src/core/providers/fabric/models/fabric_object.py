@@ -38,6 +38,9 @@ class FabricObject(BaseModel):
     skewX: int = Field(default=0)
     skewY: int = Field(default=0)
 
+    def clone(self) -> "FabricObject":
+        return self.model_copy()
+
     def get_box(self) -> Tuple[int, int, int, int]:
         return (
             round(self.left),
@@ -0,0 +1,81 @@
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    ItemsView,
+    Iterable,
+    Iterator,
+    MutableMapping,
+    Set,
+    Tuple,
+)
+
+Snapshot = Tuple[Dict[str, Any], Dict[str, bytes]]
+
+
+class LazyContext(MutableMapping[str, Any]):
+    def __init__(
+        self, buffers: Dict[str, bytes], loader: Callable[[bytes], Any]
+    ) -> None:
+        self._buffers = dict(buffers)
+        self._values: Dict[str, Any] = {}
+        self._loader = loader
+        self._used_keys: Set[str] = set()
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._values:
+            self._values[key] = self._loader(self._buffers[key])
+            del self._buffers[key]
+
+        self._used_keys.add(key)
+        return self._values[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._buffers.pop(key, None)
+        self._values[key] = value
+        self._used_keys.add(key)
+
+    def __delitem__(self, key: str) -> None:
+        if key in self._values:
+            del self._values[key]
+        else:
+            del self._buffers[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._values or key in self._buffers
+
+    def __iter__(self) -> Iterator[str]:
+        yield from list(self._values)
+        yield from list(self._buffers)
+
+    def __len__(self) -> int:
+        return len(self._values) + len(self._buffers)
+
+    def get_loaded_items(self) -> ItemsView[str, Any]:
+        return self._values.items()
+
+    def get_buffers(self) -> Dict[str, bytes]:
+        return dict(self._buffers)
+
+    def snapshot(self) -> Snapshot:
+        return dict(self._values), dict(self._buffers)
+
+    def restore(self, snapshot: Snapshot, keys: Iterable[str]) -> None:
+        values, buffers = snapshot
+
+        for key in keys:
+            self._values.pop(key, None)
+            self._buffers.pop(key, None)
+
+            if key in values:
+                self._values[key] = values[key]
+            elif key in buffers:
+                self._buffers[key] = buffers[key]
+
+    def release_unused(self, buffers: Dict[str, bytes]) -> None:
+        for key in set(self._values) - self._used_keys:
+            if key in buffers:
+                self._buffers[key] = buffers[key]
+                del self._values[key]
+
+        self._used_keys.clear()
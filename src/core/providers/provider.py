@@ -6,9 +6,11 @@ from typing import Any, Callable, Dict, List, Literal, Optional, Tuple, Union
 
 from pydantic import TypeAdapter
 
+from core.providers.lazy_context import LazyContext
 from models.phase import ChatPhase, Message
 from schemas.file import File
 from schemas.language import Language
+from utils.codec import decode_binary_format, encode_binary_format, is_binary_format
 from utils.env import ENV
 from utils.typing import get_annotation_name
 
@@ -18,6 +20,13 @@ UNEXPECTED_ERROR_OCCURRED_TEMPLATE = (
 )
 
 
+class MaterializationError(Exception):
+    def __init__(self, varnames: List[str], error: Exception) -> None:
+        super().__init__(str(error))
+        self.varnames = varnames
+        self.error = error
+
+
 def validate_params_by_annotations(func):
     @wraps(func)
     async def wrapper(self, *args, **kwargs):
@@ -94,11 +103,10 @@ class Provider(ABC):
     ) -> None:
         self._lang_to_exemplars = lang_to_exemplars
         context_value_type = Union[context_value_types]
-        self._context_adapter = TypeAdapter(Dict[str, context_value_type])
         self._context_value_adapter = TypeAdapter(context_value_type)
         self._type_to_alias = type_to_alias
         self._language: Language = None
-        self._context: Dict[str, Any] = None
+        self._context: LazyContext = None
         self._feedback: Message = None
         self._response: Message = None
 
@@ -110,9 +118,12 @@ class Provider(ABC):
     def convert_object_to_file(self, obj: Any) -> File:
         pass
 
-    def get_context(self) -> Dict[str, Any]:
+    def get_context(self) -> LazyContext:
         return self._context
 
+    async def materialize_context(self) -> None:
+        pass
+
     def get_feedback(self) -> Optional[Message]:
         return self._feedback
 
@@ -123,7 +134,7 @@ class Provider(ABC):
         return self._lang_to_exemplars[self._language]
 
     def get_varname(self, value: Any) -> None:
-        id_to_varname = {id(v): k for k, v in self._context.items()}
+        id_to_varname = {id(v): k for k, v in self._context.get_loaded_items()}
         return id_to_varname[id(value)]
 
     def get_obj_alias(self, obj: Any) -> str:
@@ -142,17 +153,40 @@ class Provider(ABC):
     def clear_feedback(self) -> None:
         self._feedback = None
 
-    def load_context_from_buffer(self, buffer: bytes) -> None:
-        self._context = self._context_adapter.validate_json(buffer)
+    def set_context(self, context: LazyContext) -> None:
+        self._context = context
         self._context.update({f.__name__: f for f in self.get_prompt_functions()})
 
-    def save_context_to_buffer(self) -> bytes:
+    def load_context_from_buffers(self, buffers: Dict[str, bytes]) -> None:
+        self.set_context(LazyContext(buffers, self._load_context_value))
+
+    def save_context_to_buffers(self) -> Dict[str, bytes]:
         filtered_context = self._filter_context(self._context)
-        return self._context_adapter.dump_json(filtered_context)
+        buffers = filtered_context.get_buffers()
+
+        for k, v in filtered_context.get_loaded_items():
+            buffers[k] = self._dump_context_value(v)
+
+        filtered_context.release_unused(buffers)
+        return buffers
+
+    def _load_context_value(self, buffer: bytes) -> Any:
+        if is_binary_format(buffer):
+            obj = decode_binary_format(buffer)
+            return self._context_value_adapter.validate_python(obj)
+
+        return self._context_value_adapter.validate_json(buffer)
+
+    def _dump_context_value(self, value: Any) -> bytes:
+        if ENV.CONTEXT_FORMAT == "binary":
+            obj = self._context_value_adapter.dump_python(value, mode="json")
+            return encode_binary_format(obj)
+
+        return self._context_value_adapter.dump_json(value)
 
-    def _filter_context(self, context: Dict[str, Any]) -> Dict[str, Any]:
+    def _filter_context(self, context: LazyContext) -> LazyContext:
         invalid_keys = {
-            k for k, v in context.items() if not self._check_context_value(v)
+            k for k, v in context.get_loaded_items() if not self._check_context_value(v)
         }
 
         for k in invalid_keys:
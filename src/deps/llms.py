@@ -1,14 +1,64 @@
+from typing import Any, Dict, Optional, get_args
+
+import aiohttp
+import google.generativeai as genai
+
 from core.llms.google_llm import GoogleLLM
 from core.llms.llm import LLM
 from core.llms.openai_llm import OpenAILLM
 from schemas.llm import LLM as LLMType
+from utils.env import ENV
 
 
-def get_llm(type: LLMType) -> LLM:
-    if type == "gemini-1.5-flash":
-        return GoogleLLM("gemini-1.5-flash")
+class LLMRegistry:
+    def __init__(
+        self, max_connections: int, configs: Dict[str, Dict[str, Any]]
+    ) -> None:
+        self._max_connections = max_connections
+        self._configs = configs
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._llms: Dict[LLMType, LLM] = {}
+
+    async def start(self) -> None:
+        if self._session and not self._session.closed:
+            return
+
+        connector = aiohttp.TCPConnector(
+            limit=self._max_connections, ttl_dns_cache=300, keepalive_timeout=60
+        )
+        self._session = aiohttp.ClientSession(connector=connector)
+        genai.configure(api_key=ENV.GOOGLE_API_KEY)
+        self._llms = {type: self._create_llm(type) for type in get_args(LLMType)}
+
+    async def close(self) -> None:
+        self._llms.clear()
+
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    def get(self, type: LLMType) -> LLM:
+        if type not in self._llms:
+            self._llms[type] = self._create_llm(type)
 
-    if type == "gpt-3.5-turbo":
-        return OpenAILLM("gpt-3.5-turbo")
+        return self._llms[type]
 
-    raise ValueError(f"Invalid LLM type: {type}")
+    def _create_llm(self, type: LLMType) -> LLM:
+        config = dict(self._configs.get(type, {}))
+
+        if type == "gemini-1.5-flash":
+            return GoogleLLM(config.pop("model_name", type), **config)
+
+        if type == "gpt-3.5-turbo":
+            return OpenAILLM(
+                config.pop("model_name", type), session=self._session, **config
+            )
+
+        raise ValueError(f"Invalid LLM type: {type}")
+
+
+llm_registry = LLMRegistry(ENV.LLM_MAX_CONNECTIONS, ENV.LLM_CONFIGS)
+
+
+def get_llm(type: LLMType) -> LLM:
+    return llm_registry.get(type)
@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import json
+import re
+from typing import Any, AsyncIterator, Dict, Optional, Set, Tuple
+
+from bson import ObjectId
+from PIL import ImageFile
+
+from lib.fs import (
+    delete_files,
+    find_file_metadata,
+    get_sync_bucket,
+    rename_file,
+    touch_file,
+    write_file,
+    write_stream,
+)
+from utils.cache import LRUCache
+from utils.codec import decode_binary_format, is_binary_format
+
+BLOB_BUCKET_NAME = "blobs"
+BLOB_REF_PREFIX = "sha256:"
+BLOB_REF_PATTERN = re.compile(rb"sha256:[0-9a-f]{64}")
+BLOB_CACHE_MAX_SIZE = 256 * 1024 * 1024
+
+Blob = Tuple[bytes, str]
+
+_pending_blobs: Dict[str, Blob] = {}
+_flushing_blobs: Dict[str, asyncio.Task] = {}
+_blob_cache = LRUCache(BLOB_CACHE_MAX_SIZE)
+
+
+def put_blob(buffer: bytes, content_type: str) -> str:
+    ref = BLOB_REF_PREFIX + hashlib.sha256(buffer).hexdigest()
+
+    if ref not in _pending_blobs:
+        _pending_blobs[ref] = (buffer, content_type)
+
+    if ref not in _blob_cache:
+        _blob_cache.put(ref, (buffer, content_type), len(buffer))
+
+    return ref
+
+
+def get_blob(ref: str) -> Blob:
+    if ref in _pending_blobs:
+        return _pending_blobs[ref]
+
+    if blob := _blob_cache.get(ref):
+        return blob
+
+    bucket = get_sync_bucket(BLOB_BUCKET_NAME)
+    stream = bucket.open_download_stream_by_name(ref)
+    blob = (stream.read(), stream.metadata["content_type"])
+    _blob_cache.put(ref, blob, len(blob[0]))
+    return blob
+
+
+async def ingest_blob(
+    chunks: AsyncIterator[bytes], content_type: str
+) -> Tuple[str, Dict[str, Any]]:
+    digest = hashlib.sha256()
+    metadata: Dict[str, Any] = {"content_type": content_type}
+    parser = ImageFile.Parser() if content_type.startswith("image/") else None
+
+    async def inspect_chunks() -> AsyncIterator[bytes]:
+        nonlocal parser
+
+        async for chunk in chunks:
+            digest.update(chunk)
+
+            if parser:
+                try:
+                    parser.feed(chunk)
+                except Exception:
+                    parser = None
+
+            if parser and parser.image:
+                metadata["width"], metadata["height"] = parser.image.size
+                parser = None
+
+            yield chunk
+
+    upload_name = f"upload:{ObjectId()}"
+    file_id = await write_stream(BLOB_BUCKET_NAME, upload_name, inspect_chunks())
+    ref = BLOB_REF_PREFIX + digest.hexdigest()
+
+    if await has_blob(ref):
+        await delete_files(BLOB_BUCKET_NAME, [file_id])
+    else:
+        await rename_file(BLOB_BUCKET_NAME, file_id, ref, metadata)
+
+    return ref, metadata
+
+
+async def get_blob_metadata(ref: str) -> Optional[Dict[str, Any]]:
+    if blob := _pending_blobs.get(ref):
+        return {"content_type": blob[1]}
+
+    return await find_file_metadata(BLOB_BUCKET_NAME, ref)
+
+
+async def has_blob(ref: str) -> bool:
+    if ref in _pending_blobs:
+        return True
+
+    return await touch_file(BLOB_BUCKET_NAME, ref)
+
+
+async def flush_blobs() -> None:
+    for ref in list(_pending_blobs):
+        if ref not in _flushing_blobs:
+            _flushing_blobs[ref] = asyncio.create_task(write_blob(ref))
+
+    await asyncio.gather(*_flushing_blobs.values())
+
+
+async def write_blob(ref: str) -> None:
+    buffer, content_type = _pending_blobs[ref]
+
+    try:
+        if not await touch_file(BLOB_BUCKET_NAME, ref):
+            metadata = {"content_type": content_type}
+            await write_file(BLOB_BUCKET_NAME, ref, buffer, metadata)
+
+        _pending_blobs.pop(ref, None)
+
+    finally:
+        _flushing_blobs.pop(ref, None)
+
+
+def is_blob_ref(src: str) -> bool:
+    return src.startswith(BLOB_REF_PREFIX)
+
+
+def find_blob_refs(buffer: bytes) -> Set[str]:
+    if is_binary_format(buffer):
+        buffer = json.dumps(decode_binary_format(buffer)).encode()
+
+    return {ref.decode() for ref in BLOB_REF_PATTERN.findall(buffer)}
@@ -0,0 +1,205 @@
+import asyncio
+import json
+import traceback
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Set, Tuple
+from uuid import uuid4
+
+from bson import ObjectId
+from gridfs.errors import NoFile
+from pydantic import BaseModel, Field
+from pymongo.errors import DuplicateKeyError
+
+from lib.blobs import BLOB_BUCKET_NAME
+from lib.context_store import MANIFEST_BUCKET_NAME, VALUE_BUCKET_NAME, is_manifest
+from lib.db import get_db, init_db
+from lib.fs import delete_files, read_file
+from models.chat import Chat
+from models.phase import ChatPhase
+from utils.env import ENV
+from utils.time import utc_now
+
+ORPHAN_GRACE_PERIOD = timedelta(hours=1)
+LOCK_COLLECTION_NAME = "locks"
+COMPACTION_LOCK_ID = "compaction"
+COMPACTION_LOCK_OWNER = str(uuid4())
+
+
+class CompactionReport(BaseModel):
+    deleted_chats: int = Field(default=0)
+    deleted_phases: int = Field(default=0)
+    deleted_files: int = Field(default=0)
+    reclaimed_bytes: int = Field(default=0)
+
+
+async def compact() -> CompactionReport:
+    report = CompactionReport()
+    expiry = utc_now() - timedelta(days=ENV.CHAT_TTL_DAYS)
+    orphan_expiry = utc_now() - ORPHAN_GRACE_PERIOD
+
+    await delete_expired_chats(expiry, report)
+    await delete_orphaned_phases(expiry, report)
+
+    context_ids = await get_live_context_ids()
+    await delete_orphaned_files(
+        MANIFEST_BUCKET_NAME, "_id", context_ids, orphan_expiry, report
+    )
+
+    value_hashes, blob_refs = await get_live_references(context_ids)
+    await delete_orphaned_files(
+        VALUE_BUCKET_NAME, "filename", value_hashes, orphan_expiry, report
+    )
+    await delete_orphaned_files(
+        BLOB_BUCKET_NAME, "filename", blob_refs, orphan_expiry, report
+    )
+
+    return report
+
+
+async def delete_expired_chats(expiry: datetime, report: CompactionReport) -> None:
+    chats = Chat.get_motor_collection()
+    phases = ChatPhase.get_motor_collection()
+    cursor = chats.find(create_expiry_query("updated_at", expiry), {"phases": 1})
+
+    async for batch in iter_batches(cursor):
+        chat_ids = [doc["_id"] for doc in batch]
+        phase_ids = [ref.id for doc in batch for ref in doc.get("phases", [])]
+        result = await phases.delete_many({"_id": {"$in": phase_ids}})
+        report.deleted_phases += result.deleted_count
+        result = await chats.delete_many({"_id": {"$in": chat_ids}})
+        report.deleted_chats += result.deleted_count
+        await asyncio.sleep(ENV.COMPACTION_BATCH_DELAY_SECONDS)
+
+
+async def delete_orphaned_phases(expiry: datetime, report: CompactionReport) -> None:
+    chats = Chat.get_motor_collection()
+    phases = ChatPhase.get_motor_collection()
+    linked_ids = set()
+
+    async for doc in chats.find({}, {"phases": 1}):
+        linked_ids.update(ref.id for ref in doc.get("phases", []))
+
+    cursor = phases.find(create_expiry_query("created_at", expiry), {"_id": 1})
+
+    async for batch in iter_batches(cursor):
+        phase_ids = [doc["_id"] for doc in batch if doc["_id"] not in linked_ids]
+        result = await phases.delete_many({"_id": {"$in": phase_ids}})
+        report.deleted_phases += result.deleted_count
+        await asyncio.sleep(ENV.COMPACTION_BATCH_DELAY_SECONDS)
+
+
+async def delete_orphaned_files(
+    bucket_name: str,
+    key: str,
+    live_keys: Set[Any],
+    expiry: datetime,
+    report: CompactionReport,
+) -> None:
+    files = get_db()[f"{bucket_name}.files"]
+    query = {"uploadDate": {"$lt": expiry}}
+    cursor = files.find(query, {"_id": 1, "filename": 1, "length": 1})
+
+    async for batch in iter_batches(cursor):
+        orphan_ids = [doc["_id"] for doc in batch if doc[key] not in live_keys]
+        deleted = await delete_files(bucket_name, orphan_ids, expiry)
+        report.deleted_files += len(deleted)
+        report.reclaimed_bytes += sum(doc["length"] for doc in deleted)
+        await asyncio.sleep(ENV.COMPACTION_BATCH_DELAY_SECONDS)
+
+
+async def get_live_context_ids() -> Set[ObjectId]:
+    chats = Chat.get_motor_collection()
+    cursor = chats.find({}, {"state.context_id": 1})
+    return {doc["state"]["context_id"] async for doc in cursor}
+
+
+async def get_live_references(context_ids: Set[ObjectId]) -> Tuple[Set[str], Set[str]]:
+    value_hashes = set()
+    blob_refs = set()
+
+    files = get_db()[f"{MANIFEST_BUCKET_NAME}.files"]
+    query = {"_id": {"$in": list(context_ids)}}
+    cursor = files.find(query, {"_id": 1, "metadata": 1})
+    docs = await cursor.to_list(length=None)
+    manifest_ids = [doc["_id"] for doc in docs if is_manifest(doc.get("metadata"))]
+
+    if missing_ids := context_ids - {doc["_id"] for doc in docs}:
+        print(f"Compaction skipped {len(missing_ids)} missing contexts")
+
+    for context_id in manifest_ids:
+        try:
+            buffer, _ = await read_file(MANIFEST_BUCKET_NAME, context_id)
+        except NoFile:
+            print(f"Compaction skipped missing context {context_id}")
+            continue
+
+        manifest = json.loads(buffer)
+        value_hashes.update(manifest["values"].values())
+        blob_refs.update(manifest.get("blobs", []))
+
+    return value_hashes, blob_refs
+
+
+async def iter_batches(cursor: Any) -> AsyncIterator[List[Dict[str, Any]]]:
+    batch: List[Dict[str, Any]] = []
+
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) == ENV.COMPACTION_BATCH_SIZE:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def create_expiry_query(field: str, expiry: datetime) -> Dict[str, Any]:
+    return {
+        "$or": [
+            {field: {"$lt": expiry}},
+            {
+                field: {"$exists": False},
+                "_id": {"$lt": ObjectId.from_datetime(expiry)},
+            },
+        ]
+    }
+
+
+async def acquire_compaction_lock() -> bool:
+    now = utc_now()
+    lease = timedelta(seconds=ENV.COMPACTION_INTERVAL_SECONDS * 2)
+    query = {
+        "_id": COMPACTION_LOCK_ID,
+        "$or": [{"owner": COMPACTION_LOCK_OWNER}, {"expires_at": {"$lt": now}}],
+    }
+    update = {"$set": {"owner": COMPACTION_LOCK_OWNER, "expires_at": now + lease}}
+
+    try:
+        await get_db()[LOCK_COLLECTION_NAME].update_one(query, update, upsert=True)
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def run_compaction_loop() -> None:
+    while True:
+        await asyncio.sleep(ENV.COMPACTION_INTERVAL_SECONDS)
+
+        try:
+            if not await acquire_compaction_lock():
+                continue
+
+            report = await compact()
+            print(f"Compaction finished: {report}")
+        except Exception:
+            print(traceback.format_exc())
+
+
+async def main() -> None:
+    await init_db()
+    report = await compact()
+    print(report.model_dump_json(indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, Dict, Hashable, MutableMapping, Optional, Tuple
+from uuid import uuid4
+
+from bson import ObjectId
+
+from lib.blobs import find_blob_refs
+from lib.fs import read_file, read_file_by_name, touch_file, write_file
+from utils.cache import LRUCache
+
+MANIFEST_BUCKET_NAME = "contexts"
+VALUE_BUCKET_NAME = "context-values"
+MANIFEST_FORMAT = "manifest"
+CONTEXT_CACHE_MAX_SIZE = 512 * 1024 * 1024
+
+Manifest = Dict[str, str]
+CachedContext = Tuple[Manifest, MutableMapping[str, Any]]
+
+context_cache = LRUCache(CONTEXT_CACHE_MAX_SIZE)
+
+
+async def load_context(context_id: ObjectId) -> Tuple[Manifest, Dict[str, bytes]]:
+    manifest_buffer, metadata = await read_file(MANIFEST_BUCKET_NAME, context_id)
+
+    if not is_manifest(metadata):
+        return {}, split_legacy_context(manifest_buffer)
+
+    manifest: Manifest = json.loads(manifest_buffer)["values"]
+    values = await asyncio.gather(
+        *(read_file_by_name(VALUE_BUCKET_NAME, h) for h in manifest.values())
+    )
+    buffers = {varname: buffer for varname, (buffer, _) in zip(manifest.keys(), values)}
+
+    return manifest, buffers
+
+
+async def save_context(
+    buffers: Dict[str, bytes], manifest: Manifest
+) -> Tuple[ObjectId, Manifest]:
+    stored_hashes = set(manifest.values())
+    new_manifest: Manifest = {}
+    blob_refs = set()
+
+    for varname, buffer in buffers.items():
+        value_hash = hash_buffer(buffer)
+        new_manifest[varname] = value_hash
+        blob_refs.update(find_blob_refs(buffer))
+
+        if value_hash in stored_hashes:
+            continue
+
+        if not await touch_file(VALUE_BUCKET_NAME, value_hash):
+            await write_file(VALUE_BUCKET_NAME, value_hash, buffer)
+
+        stored_hashes.add(value_hash)
+
+    manifest_buffer = json.dumps(
+        {"values": new_manifest, "blobs": sorted(blob_refs)}
+    ).encode()
+    context_id = await write_file(
+        MANIFEST_BUCKET_NAME,
+        f"{uuid4()}.json",
+        manifest_buffer,
+        metadata={"format": MANIFEST_FORMAT},
+    )
+
+    return context_id, new_manifest
+
+
+def take_cached_context(key: Hashable) -> Optional[CachedContext]:
+    cached_context = context_cache.get(key)
+    context_cache.pop(key)
+    return cached_context
+
+
+def cache_context(
+    key: Hashable, manifest: Manifest, context: MutableMapping[str, Any], size: int
+) -> None:
+    context_cache.put(key, (manifest, context), size)
+
+
+def hash_buffer(buffer: bytes) -> str:
+    return hashlib.sha256(buffer).hexdigest()
+
+
+def is_manifest(metadata: Dict) -> bool:
+    return (metadata or {}).get("format") == MANIFEST_FORMAT
+
+
+def split_legacy_context(buffer: bytes) -> Dict[str, bytes]:
+    return {k: json.dumps(v).encode() for k, v in json.loads(buffer).items()}
@@ -1,11 +1,127 @@
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from bson import ObjectId
 from gridfs import GridFSBucket
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket, AsyncIOMotorGridOut
+
+from lib.db import client
+from utils.time import utc_now
+
+CHUNK_SIZE = 255 * 1024
+
+
+def get_bucket(name: str) -> AsyncIOMotorGridFSBucket:
+    return AsyncIOMotorGridFSBucket(client.get_database(), name)
+
+
+def get_sync_bucket(name: str) -> GridFSBucket:
+    return GridFSBucket(client.delegate.get_database(), name)
+
+
+async def iter_chunks(stream: AsyncIOMotorGridOut) -> AsyncIterator[bytes]:
+    while chunk := await stream.readchunk():
+        yield chunk
+
+
+async def read_file(
+    bucket_name: str, file_id: ObjectId
+) -> Tuple[bytes, Optional[Dict[str, Any]]]:
+    bucket = get_bucket(bucket_name)
+    stream = await bucket.open_download_stream(file_id)
+    chunks = [chunk async for chunk in iter_chunks(stream)]
+    return b"".join(chunks), stream.metadata
+
+
+async def read_file_by_name(
+    bucket_name: str, filename: str
+) -> Tuple[bytes, Optional[Dict[str, Any]]]:
+    bucket = get_bucket(bucket_name)
+    stream = await bucket.open_download_stream_by_name(filename)
+    chunks = [chunk async for chunk in iter_chunks(stream)]
+    return b"".join(chunks), stream.metadata
+
+
+async def write_file(
+    bucket_name: str,
+    filename: str,
+    buffer: bytes,
+    metadata: Optional[Dict[str, Any]] = None,
+) -> ObjectId:
+    bucket = get_bucket(bucket_name)
+    stream = bucket.open_upload_stream(filename, metadata=metadata)
+    view = memoryview(buffer)
 
-from src.utils.env import ENV
+    for start in range(0, len(view), CHUNK_SIZE):
+        await stream.write(view[start : start + CHUNK_SIZE])
 
-client = MongoClient(ENV.MONGO_URI)
+    await stream.close()
+    return stream._id
 
 
-def get_bucket(name: str) -> GridFSBucket:
+async def write_stream(
+    bucket_name: str,
+    filename: str,
+    chunks: AsyncIterator[bytes],
+    metadata: Optional[Dict[str, Any]] = None,
+) -> ObjectId:
+    bucket = get_bucket(bucket_name)
+    stream = bucket.open_upload_stream(filename, metadata=metadata)
+
+    async for chunk in chunks:
+        await stream.write(chunk)
+
+    await stream.close()
+    return stream._id
+
+
+async def rename_file(
+    bucket_name: str,
+    file_id: ObjectId,
+    filename: str,
+    metadata: Optional[Dict[str, Any]] = None,
+) -> None:
+    files = client.get_database()[f"{bucket_name}.files"]
+    update = {"filename": filename}
+    if metadata is not None:
+        update["metadata"] = metadata
+
+    await files.update_one({"_id": file_id}, {"$set": update})
+
+
+async def find_file_metadata(
+    bucket_name: str, filename: str
+) -> Optional[Dict[str, Any]]:
+    files = client.get_database()[f"{bucket_name}.files"]
+    doc = await files.find_one({"filename": filename}, {"metadata": 1})
+    return doc.get("metadata") if doc else None
+
+
+async def touch_file(bucket_name: str, filename: str) -> bool:
+    files = client.get_database()[f"{bucket_name}.files"]
+    result = await files.update_many(
+        {"filename": filename}, {"$set": {"uploadDate": utc_now()}}
+    )
+    return result.matched_count > 0
+
+
+async def delete_files(
+    bucket_name: str, file_ids: List[ObjectId], expiry: Optional[datetime] = None
+) -> List[Dict[str, Any]]:
     db = client.get_database()
-    return GridFSBucket(db, name)
+    files = db[f"{bucket_name}.files"]
+    expiry_query = {"uploadDate": {"$lt": expiry}} if expiry else {}
+    deleted = []
+
+    for file_id in file_ids:
+        query = {"_id": file_id, **expiry_query}
+        if doc := await files.find_one_and_delete(query, {"_id": 1, "length": 1}):
+            deleted.append(doc)
+
+    if deleted:
+        deleted_ids = [doc["_id"] for doc in deleted]
+        await db[f"{bucket_name}.chunks"].delete_many(
+            {"files_id": {"$in": deleted_ids}}
+        )
+
+    return deleted
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import time
+from contextlib import suppress
+from typing import AsyncIterator, BinaryIO, Dict, Optional, Tuple
+from uuid import uuid4
+
+from utils.cache import LRUCache
+from utils.env import ENV
+from utils.executor import run_in_executor
+
+ML_CACHE_MAX_SIZE = 256 * 1024 * 1024
+ML_CACHE_READ_CHUNK_SIZE = 64 * 1024
+
+_ml_cache = LRUCache(ML_CACHE_MAX_SIZE)
+
+
+def create_ml_cache_key(
+    endpoint: str, files: Dict[str, bytes], fields: Dict[str, str]
+) -> str:
+    digest = hashlib.sha256(endpoint.encode())
+    digest.update(json.dumps(fields, sort_keys=True).encode())
+
+    for name in sorted(files):
+        digest.update(name.encode())
+        digest.update(hashlib.sha256(files[name]).digest())
+
+    return digest.hexdigest()
+
+
+async def get_ml_result(key: str) -> Optional[bytes]:
+    if entry := _ml_cache.get(key):
+        expires_at, buffer = entry
+        if expires_at > time.time():
+            return buffer
+
+        _ml_cache.pop(key)
+
+    if not ENV.ML_CACHE_DIR:
+        return None
+
+    buffer = await run_in_executor(read_disk_entry, key)
+    if buffer is not None:
+        _ml_cache.put(
+            key, (time.time() + ENV.ML_CACHE_TTL_SECONDS, buffer), len(buffer)
+        )
+
+    return buffer
+
+
+async def put_ml_result(key: str, buffer: bytes) -> None:
+    _ml_cache.put(key, (time.time() + ENV.ML_CACHE_TTL_SECONDS, buffer), len(buffer))
+
+    if ENV.ML_CACHE_DIR:
+        await run_in_executor(write_disk_entry, key, buffer)
+
+
+async def get_ml_stream(key: str) -> Optional[AsyncIterator[bytes]]:
+    if not ENV.ML_CACHE_DIR:
+        return None
+
+    file = await run_in_executor(open_disk_entry, key)
+    return iter_disk_entry(file) if file else None
+
+
+async def put_ml_stream(key: str, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    if not ENV.ML_CACHE_DIR:
+        async for chunk in chunks:
+            yield chunk
+        return
+
+    file, temp_path = await run_in_executor(create_disk_entry, key)
+
+    try:
+        async for chunk in chunks:
+            await run_in_executor(file.write, chunk)
+            yield chunk
+
+        await run_in_executor(commit_disk_entry, key, file, temp_path)
+
+    except BaseException:
+        await run_in_executor(discard_disk_entry, file, temp_path)
+        raise
+
+
+def get_ml_cache_stats() -> Dict[str, int]:
+    return _ml_cache.get_stats()
+
+
+def get_disk_entry_path(key: str) -> str:
+    return os.path.join(ENV.ML_CACHE_DIR, key[:2], key)
+
+
+def open_disk_entry(key: str) -> Optional[BinaryIO]:
+    path = get_disk_entry_path(key)
+
+    try:
+        if time.time() - os.path.getmtime(path) > ENV.ML_CACHE_TTL_SECONDS:
+            os.remove(path)
+            return None
+
+        return open(path, "rb")
+
+    except FileNotFoundError:
+        return None
+
+
+async def iter_disk_entry(file: BinaryIO) -> AsyncIterator[bytes]:
+    try:
+        while chunk := await run_in_executor(file.read, ML_CACHE_READ_CHUNK_SIZE):
+            yield chunk
+    finally:
+        file.close()
+
+
+def read_disk_entry(key: str) -> Optional[bytes]:
+    file = open_disk_entry(key)
+    if file is None:
+        return None
+
+    with file:
+        return file.read()
+
+
+def create_disk_entry(key: str) -> Tuple[BinaryIO, str]:
+    path = get_disk_entry_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{uuid4().hex}.tmp"
+    return open(temp_path, "wb"), temp_path
+
+
+def commit_disk_entry(key: str, file: BinaryIO, temp_path: str) -> None:
+    file.close()
+    os.replace(temp_path, get_disk_entry_path(key))
+
+
+def discard_disk_entry(file: BinaryIO, temp_path: str) -> None:
+    file.close()
+    with suppress(FileNotFoundError):
+        os.remove(temp_path)
+
+
+def write_disk_entry(key: str, buffer: bytes) -> None:
+    file, temp_path = create_disk_entry(key)
+    with file:
+        file.write(buffer)
+
+    commit_disk_entry(key, file, temp_path)
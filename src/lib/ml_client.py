@@ -0,0 +1,125 @@
+import asyncio
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import aiohttp
+
+from utils.env import ENV
+from utils.events import emit_event
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class MLServiceError(Exception):
+    def __init__(self, url: str, status: int) -> None:
+        super().__init__(f"Request to {url} failed with status {status}")
+        self.url = url
+        self.status = status
+
+
+class EndpointStats:
+    def __init__(self) -> None:
+        self.requests = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.total_seconds = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        completed = self.requests - self.in_flight
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "avg_seconds": self.total_seconds / completed if completed else 0.0,
+        }
+
+
+class MLClient:
+    def __init__(
+        self, max_connections: int, endpoint_concurrency: int, timeout: float
+    ) -> None:
+        self._max_connections = max_connections
+        self._endpoint_concurrency = endpoint_concurrency
+        self._timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._stats: Dict[str, EndpointStats] = defaultdict(EndpointStats)
+
+    async def start(self) -> None:
+        if self._session and not self._session.closed:
+            return
+
+        connector = aiohttp.TCPConnector(
+            limit=self._max_connections, ttl_dns_cache=300, keepalive_timeout=60
+        )
+        timeout = aiohttp.ClientTimeout(total=self._timeout)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def close(self) -> None:
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    async def post(self, endpoint: str, data: aiohttp.FormData) -> bytes:
+        async with self._request("POST", endpoint, data=data) as response:
+            return await response.read()
+
+    async def stream_post(
+        self, endpoint: str, data: aiohttp.FormData
+    ) -> AsyncIterator[bytes]:
+        async with self._request("POST", endpoint, data=data) as response:
+            async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                yield chunk
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_connections": self._max_connections,
+            "endpoint_concurrency": self._endpoint_concurrency,
+            "endpoints": {url: stats.to_dict() for url, stats in self._stats.items()},
+        }
+
+    @asynccontextmanager
+    async def _request(
+        self, method: str, url: str, **kwargs: Any
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        await self.start()
+        semaphore = self._semaphores.setdefault(
+            url, asyncio.Semaphore(self._endpoint_concurrency)
+        )
+        stats = self._stats[url]
+        stats.waiting += 1
+
+        async with semaphore:
+            stats.waiting -= 1
+            stats.requests += 1
+            stats.in_flight += 1
+            started_at = time.perf_counter()
+            status = None
+            emit_event("ml_request", url=url)
+
+            try:
+                async with self._session.request(method, url, **kwargs) as response:
+                    status = response.status
+                    if response.status >= 400:
+                        raise MLServiceError(url, response.status)
+
+                    yield response
+
+            except Exception:
+                stats.failures += 1
+                raise
+
+            finally:
+                seconds = time.perf_counter() - started_at
+                stats.in_flight -= 1
+                stats.total_seconds += seconds
+                emit_event("ml_response", url=url, status=status, seconds=seconds)
+
+
+ml_client = MLClient(
+    ENV.ML_MAX_CONNECTIONS, ENV.ML_ENDPOINT_CONCURRENCY, ENV.ML_REQUEST_TIMEOUT_SECONDS
+)
@@ -1,17 +1,37 @@
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from deps.llms import llm_registry
+from lib.compaction import run_compaction_loop
 from lib.db import init_db
-from routes import chat, phase
+from lib.ml_client import ml_client
+from routes import chat, phase, stats
+from utils.env import ENV
+from utils.fetch import close_fetch_session
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    await ml_client.start()
+    await llm_registry.start()
+    compaction_task = None
+
+    if ENV.COMPACTION_INTERVAL_SECONDS > 0:
+        compaction_task = asyncio.create_task(run_compaction_loop())
+
     yield
 
+    if compaction_task:
+        compaction_task.cancel()
+
+    await ml_client.close()
+    await close_fetch_session()
+    await llm_registry.close()
+
 
 app = FastAPI(lifespan=lifespan)
 
@@ -27,3 +47,4 @@ app.add_middleware(
 
 app.include_router(chat.router, prefix="/api")
 app.include_router(phase.router, prefix="/api")
+app.include_router(stats.router, prefix="/api")
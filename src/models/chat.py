@@ -1,9 +1,11 @@
+from datetime import datetime
 from typing import Dict, List
 
 from beanie import Document, Link, PydanticObjectId
 from pydantic import BaseModel, Field
 
 from models.phase import ChatPhase
+from utils.time import utc_now
 
 
 class ChatState(BaseModel):
@@ -15,6 +17,8 @@ class ChatState(BaseModel):
 class Chat(Document):
     state: ChatState = Field(...)
     phases: List[Link["ChatPhase"]] = Field(default_factory=list)
+    updated_at: datetime = Field(default_factory=utc_now)
+    version: int = Field(default=0)
 
     class Settings:
         name = "internal-chats"
@@ -1,8 +1,11 @@
+from datetime import datetime
 from typing import List, Literal, Optional
 
 from beanie import Document
 from pydantic import BaseModel, Field
 
+from utils.time import utc_now
+
 
 class Message(BaseModel):
     src: Literal["user", "system", "llm"] = Field(...)
@@ -31,6 +34,7 @@ class ChatPhase(Document):
     request: Message = Field(...)
     prompt_phases: List[PromptPhase] = Field(default_factory=list)
     response: Optional[Message] = Field(default=None)
+    created_at: datetime = Field(default_factory=utc_now)
 
     class Settings:
         name = "chat-phases"
@@ -1,13 +1,11 @@
-import json
 import traceback
-from uuid import uuid4
 
 from beanie import PydanticObjectId
 from fastapi import APIRouter, HTTPException, Response
 
+from lib.context_store import save_context
 from models.chat import Chat, ChatState
 from schemas.chat_create_request import ChatCreateRequest
-from src.lib.fs import get_bucket
 
 router = APIRouter(prefix="/chats")
 
@@ -15,9 +13,7 @@ router = APIRouter(prefix="/chats")
 @router.post("")
 async def create_chat(request: ChatCreateRequest):
     try:
-        bucket = get_bucket("contexts")
-        context_buffer = json.dumps({}).encode()
-        context_id = bucket.upload_from_stream(f"{uuid4()}.json", context_buffer)
+        context_id, _ = await save_context({}, {})
         state = ChatState(context_id=context_id)
 
         chat = Chat(id=PydanticObjectId(request.chat_id), state=state)
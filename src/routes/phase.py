@@ -1,31 +1,55 @@
-import io
+import asyncio
 import traceback
-import zipfile
-from typing import List
-from uuid import uuid4
+from base64 import b64encode
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, Tuple
 
-from beanie import PydanticObjectId, WriteRules
+from beanie import PydanticObjectId
+from beanie.odm.utils.encoder import Encoder
+from bson import DBRef
 from fastapi import APIRouter
 from fastapi import File as FormFile
 from fastapi import Form, HTTPException, Query, UploadFile
 from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter, ValidationError
 
 from core.controller.generate import generate
 from core.providers.provider import Provider
 from deps.llms import get_llm
 from deps.providers import get_provider
-from lib.fs import get_bucket
+from lib.blobs import (
+    BLOB_REF_PREFIX,
+    flush_blobs,
+    get_blob_metadata,
+    has_blob,
+    ingest_blob,
+)
+from lib.context_store import (
+    cache_context,
+    load_context,
+    save_context,
+    take_cached_context,
+)
 from models.chat import Chat, ChatState
-from models.phase import Message
+from models.phase import ChatPhase, Message
 from schemas.file import File
+from schemas.file_ref import FileRef
 from schemas.language import Language
+from schemas.preflight import PreflightRequest, PreflightResponse
 from schemas.provider import Provider as ProviderType
+from utils.events import format_sse, set_event_queue
+from utils.executor import run_in_executor
+from utils.time import utc_now
+from utils.zip_stream import ZipStreamWriter
 
 router = APIRouter(prefix="/phases")
 
 MAX_CHAT_PHASES = 10
 MAX_PROMPT_PHASES = 4
 LLM = "gpt-3.5-turbo"
+PHASE_HISTORY_PROJECTION = {"prompt_phases.prompts": 0}
+PHASE_HISTORY_PAGE_FACTOR = 2
+FILE_REFS_ADAPTER = TypeAdapter(List[FileRef])
+UPLOAD_CHUNK_SIZE = 255 * 1024
 
 
 @router.post("")
@@ -35,85 +59,315 @@ async def prompt(
     provider: ProviderType = Form(...),
     language: Language = Form(...),
     upload_files: List[UploadFile] = FormFile(default=[], alias="files"),
+    file_refs: Optional[str] = Form(default=None),
 ):
+    try:
+        provider_type = provider
+        chat, provider, files = await prepare_phase(
+            chat_id, provider_type, language, upload_files, file_refs
+        )
+        new_phase = await run_phase(chat, text, provider, provider_type, files)
+
+        if not new_phase.response:
+            raise HTTPException(500)
+
+        text = new_phase.response.text
+        varnames = new_phase.response.varnames or []
+        objects = await run_in_executor(get_objects, varnames, provider)
+
+        response = StreamingResponse(
+            stream_zip(text, objects, provider),
+            media_type="application/x-zip-compressed",
+        )
+        response.headers["Content-Disposition"] = "attachment; filename=files.zip"
+        return response
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+        print(traceback.format_exc())
+        raise HTTPException(500, str(e))
+
+
+@router.post("/stream")
+async def prompt_stream(
+    chat_id: PydanticObjectId = Query(...),
+    text: str = Form(...),
+    provider: ProviderType = Form(...),
+    language: Language = Form(...),
+    upload_files: List[UploadFile] = FormFile(default=[], alias="files"),
+    file_refs: Optional[str] = Form(default=None),
+):
+    provider_type = provider
+    chat, provider, files = await prepare_phase(
+        chat_id, provider_type, language, upload_files, file_refs
+    )
+    events = stream_phase_events(chat, text, provider, provider_type, files)
+    return StreamingResponse(events, media_type="text/event-stream")
+
+
+@router.post("/preflight")
+async def preflight(
+    request: PreflightRequest, chat_id: PydanticObjectId = Query(...)
+) -> PreflightResponse:
+    chat = await Chat.get(chat_id)
+    if not chat:
+        raise HTTPException(404)
+
+    needed = []
+
+    for file_ref in request.files:
+        if not await is_file_ref_available(file_ref, chat.state):
+            needed.append(file_ref.name)
+
+    return PreflightResponse(needed=needed)
+
+
+async def prepare_phase(
+    chat_id: PydanticObjectId,
+    provider_type: ProviderType,
+    language: Language,
+    upload_files: List[UploadFile],
+    file_refs: Optional[str],
+) -> Tuple[Chat, Provider, List[File]]:
     try:
         files = await convert_upload_files_to_files(upload_files)
 
-        chat = await Chat.get(chat_id, fetch_links=True)
+        chat = await Chat.get(chat_id)
         if not chat:
             raise HTTPException(404)
 
-        bucket = get_bucket("contexts")
-        context_id = chat.state.context_id
-        context_stream = bucket.open_download_stream(context_id)
-        context_buffer = context_stream.read()
+        files += await resolve_file_refs(parse_file_refs(file_refs), chat.state)
 
-        provider = get_provider(provider)
+        provider = get_provider(provider_type)
         provider.set_language(language)
-        provider.load_context_from_buffer(context_buffer)
-
-        varnames = assign_files(files, chat.state, provider)
-        request = Message(
-            src="user",
-            type="request",
-            text=text,
-            varnames=varnames,
-        )
+        return chat, provider, files
 
-        llm = get_llm(LLM)
-        phases = [p for p in chat.phases if p.response][-MAX_CHAT_PHASES:]
+    except HTTPException:
+        raise
 
-        new_phase = await generate(
-            request=request,
-            phases=phases,
-            llm=llm,
-            provider=provider,
-            max_prompt_phases=MAX_PROMPT_PHASES,
-        )
+    except Exception as e:
+        print(traceback.format_exc())
+        raise HTTPException(500, str(e))
 
-        chat.phases.append(new_phase)
-        context_buffer = provider.save_context_to_buffer()
-        chat.state.context_id = bucket.upload_from_stream(
-            f"{uuid4()}.json", context_buffer
-        )
-        await chat.save(link_rule=WriteRules.WRITE)
 
-        if not new_phase.response:
-            raise HTTPException(500)
+async def run_phase(
+    chat: Chat,
+    text: str,
+    provider: Provider,
+    provider_type: ProviderType,
+    files: List[File],
+) -> ChatPhase:
+    context_key = (provider_type, chat.state.context_id)
+    if cached_context := take_cached_context(context_key):
+        manifest, context = cached_context
+        provider.set_context(context)
+    else:
+        manifest, context_buffers = await load_context(chat.state.context_id)
+        provider.load_context_from_buffers(context_buffers)
 
-        text = new_phase.response.text
-        varnames = new_phase.response.varnames or []
-        files = create_files(varnames, provider)
+    varnames = await run_in_executor(assign_files, files, chat.state, provider)
+    request = Message(
+        src="user",
+        type="request",
+        text=text,
+        varnames=varnames,
+    )
 
-        zip_buffer = io.BytesIO()
+    llm = get_llm(LLM)
+    phases = await get_recent_phases(chat, MAX_CHAT_PHASES)
 
-        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-            zip_file.writestr("text.txt", text)
-            for file in files:
-                zip_file.writestr(file.name, file.buffer)
+    new_phase = await generate(
+        request=request,
+        phases=phases,
+        llm=llm,
+        provider=provider,
+        max_prompt_phases=MAX_PROMPT_PHASES,
+    )
 
-        zip_buffer.seek(0)
+    await new_phase.insert()
 
-        response = StreamingResponse(
-            zip_buffer, media_type="application/x-zip-compressed"
-        )
-        response.headers["Content-Disposition"] = "attachment; filename=files.zip"
-        return response
+    context_buffers = provider.save_context_to_buffers()
+    await flush_blobs()
+    context_id, manifest = await save_context(context_buffers, manifest)
+    chat.state.context_id = context_id
+    await append_phase(chat, new_phase)
+
+    context_size = sum(len(buffer) for buffer in context_buffers.values())
+    context_key = (provider_type, context_id)
+    cache_context(context_key, manifest, provider.get_context(), context_size)
+
+    return new_phase
+
+
+async def stream_phase_events(
+    chat: Chat,
+    text: str,
+    provider: Provider,
+    provider_type: ProviderType,
+    files: List[File],
+) -> AsyncIterator[str]:
+    queue = asyncio.Queue()
+    task = asyncio.create_task(
+        run_with_events(queue, run_phase(chat, text, provider, provider_type, files))
+    )
+
+    while event := await queue.get():
+        if event["type"] == "attachment":
+            event = {"type": "attachment", **encode_file(event["file"])}
+
+        yield format_sse(event)
+
+    try:
+        new_phase = await task
+
+        if not new_phase.response:
+            raise Exception("No response was generated")
+
+        varnames = new_phase.response.varnames or []
+        objects = await run_in_executor(get_objects, varnames, provider)
+        yield format_sse({"type": "response", "text": new_phase.response.text})
+
+        for obj in objects:
+            file = await run_in_executor(provider.convert_object_to_file, obj)
+            yield format_sse({"type": "attachment", **encode_file(file)})
+
+        yield format_sse({"type": "done"})
 
     except Exception as e:
         print(traceback.format_exc())
-        raise HTTPException(500, str(e))
+        yield format_sse({"type": "error", "message": str(e)})
+
+
+async def run_with_events(queue: asyncio.Queue, coro: Awaitable[Any]) -> Any:
+    set_event_queue(queue)
+
+    try:
+        return await coro
+    finally:
+        queue.put_nowait(None)
 
 
 async def convert_upload_files_to_files(upload_files: List[UploadFile]) -> List[File]:
-    return [
-        File(
-            buffer=await upload_file.read(),
-            name=upload_file.filename,
-            content_type=upload_file.content_type,
+    files = []
+
+    for upload_file in upload_files:
+        content_type = upload_file.content_type
+
+        if content_type.startswith("image/"):
+            chunks = iter_upload_file(upload_file)
+            ref, metadata = await ingest_blob(chunks, content_type)
+            file = File(
+                name=upload_file.filename,
+                content_type=content_type,
+                ref=ref,
+                width=metadata.get("width"),
+                height=metadata.get("height"),
+            )
+        else:
+            file = File(
+                buffer=await upload_file.read(),
+                name=upload_file.filename,
+                content_type=content_type,
+            )
+
+        files.append(file)
+
+    return files
+
+
+async def iter_upload_file(upload_file: UploadFile) -> AsyncIterator[bytes]:
+    while chunk := await upload_file.read(UPLOAD_CHUNK_SIZE):
+        yield chunk
+
+
+def parse_file_refs(file_refs: Optional[str]) -> List[FileRef]:
+    if not file_refs:
+        return []
+
+    try:
+        return FILE_REFS_ADAPTER.validate_json(file_refs)
+    except ValidationError as e:
+        raise HTTPException(422, e.errors(include_url=False))
+
+
+async def resolve_file_refs(file_refs: List[FileRef], state: ChatState) -> List[File]:
+    files = []
+    missing = []
+
+    for file_ref in file_refs:
+        if not await is_file_ref_available(file_ref, state):
+            missing.append(file_ref.name)
+            continue
+
+        ref = BLOB_REF_PREFIX + file_ref.sha256
+        metadata = await get_blob_metadata(ref) or {}
+        file = File(
+            name=file_ref.name,
+            content_type=file_ref.content_type,
+            ref=ref,
+            width=metadata.get("width"),
+            height=metadata.get("height"),
         )
-        for upload_file in upload_files
-    ]
+        files.append(file)
+
+    if missing:
+        raise HTTPException(409, {"needed": missing})
+
+    return files
+
+
+async def is_file_ref_available(file_ref: FileRef, state: ChatState) -> bool:
+    file_id = file_ref.name.split(".")[0]
+    if file_id in state.id_to_varnames:
+        return True
+
+    return await has_blob(BLOB_REF_PREFIX + file_ref.sha256)
+
+
+async def append_phase(chat: Chat, phase: ChatPhase) -> None:
+    if chat.version:
+        version_query = {"version": chat.version}
+    else:
+        version_query = {"version": {"$in": [0, None]}}
+
+    phase_ref = DBRef(ChatPhase.get_collection_name(), phase.id)
+    result = await Chat.get_motor_collection().update_one(
+        {"_id": chat.id, **version_query},
+        {
+            "$push": {"phases": phase_ref},
+            "$set": {"state": Encoder().encode(chat.state), "updated_at": utc_now()},
+            "$inc": {"version": 1},
+        },
+    )
+
+    if result.matched_count == 0:
+        raise HTTPException(409, "Chat was modified by a concurrent request")
+
+    chat.version += 1
+
+
+async def get_recent_phases(chat: Chat, limit: int) -> List[ChatPhase]:
+    collection = ChatPhase.get_motor_collection()
+    phase_ids = [link.ref.id for link in chat.phases]
+    docs = []
+    end = len(phase_ids)
+
+    while end > 0 and len(docs) < limit:
+        start = max(end - limit * PHASE_HISTORY_PAGE_FACTOR, 0)
+        page_ids = phase_ids[start:end]
+        query = {"_id": {"$in": page_ids}, "response": {"$ne": None}}
+        page_docs = await collection.find(query, PHASE_HISTORY_PROJECTION).to_list(
+            length=None
+        )
+
+        id_to_index = {phase_id: i for i, phase_id in enumerate(page_ids)}
+        page_docs.sort(key=lambda doc: id_to_index[doc["_id"]])
+        docs = page_docs[len(docs) - limit :] + docs
+        end = start
+
+    return [ChatPhase.model_validate(doc) for doc in docs]
 
 
 def assign_files(files: List[File], state: ChatState, provider: Provider) -> List[str]:
@@ -145,7 +399,27 @@ def assign_files(files: List[File], state: ChatState, provider: Provider) -> Lis
     return varnames
 
 
-def create_files(varnames: List[str], provider: Provider) -> List[File]:
+def encode_file(file: File) -> Dict[str, str]:
+    return {
+        "name": file.name,
+        "content_type": file.content_type,
+        "data": b64encode(file.buffer).decode(),
+    }
+
+
+def get_objects(varnames: List[str], provider: Provider) -> List[Any]:
     context = provider.get_context()
-    objects = [context[varname] for varname in varnames]
-    return [provider.convert_object_to_file(obj) for obj in objects]
+    return [context[varname] for varname in varnames]
+
+
+async def stream_zip(
+    text: str, objects: List[Any], provider: Provider
+) -> AsyncIterator[bytes]:
+    writer = ZipStreamWriter()
+    yield await run_in_executor(writer.write, "text.txt", text.encode())
+
+    for obj in objects:
+        file = await run_in_executor(provider.convert_object_to_file, obj)
+        yield await run_in_executor(writer.write, file.name, file.buffer)
+
+    yield writer.close()
@@ -0,0 +1,20 @@
+from fastapi import APIRouter
+
+from core.providers.fabric.models.fabric_canvas import inference_image_cache
+from core.providers.fabric.models.fabric_image import decoded_image_cache
+from lib.context_store import context_cache
+from lib.ml_cache import get_ml_cache_stats
+from lib.ml_client import ml_client
+
+router = APIRouter(prefix="/stats")
+
+
+@router.get("")
+async def get_stats():
+    return {
+        "context_cache": context_cache.get_stats(),
+        "decoded_image_cache": decoded_image_cache.get_stats(),
+        "inference_image_cache": inference_image_cache.get_stats(),
+        "ml_cache": get_ml_cache_stats(),
+        "ml_client": ml_client.get_stats(),
+    }
@@ -1,7 +1,12 @@
+from typing import Optional
+
 from pydantic import BaseModel, Field
 
 
 class File(BaseModel):
-    buffer: bytes = Field(repr=False)
+    buffer: bytes = Field(default=b"", repr=False)
     name: str = Field(...)
     content_type: str = Field(...)
+    ref: Optional[str] = Field(default=None)
+    width: Optional[int] = Field(default=None)
+    height: Optional[int] = Field(default=None)
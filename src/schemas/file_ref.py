@@ -0,0 +1,7 @@
+from pydantic import BaseModel, Field
+
+
+class FileRef(BaseModel):
+    name: str = Field(...)
+    sha256: str = Field(..., pattern=r"^[0-9a-f]{64}$")
+    content_type: str = Field(...)
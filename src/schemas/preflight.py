@@ -0,0 +1,13 @@
+from typing import List
+
+from pydantic import BaseModel, Field
+
+from schemas.file_ref import FileRef
+
+
+class PreflightRequest(BaseModel):
+    files: List[FileRef] = Field(default_factory=list)
+
+
+class PreflightResponse(BaseModel):
+    needed: List[str] = Field(default_factory=list)
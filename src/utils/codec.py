@@ -0,0 +1,29 @@
+from typing import Any
+
+import msgpack
+import zstandard
+
+BINARY_FORMAT_MAGIC = b"C2EC"
+BINARY_FORMAT_VERSION = 1
+ZSTD_LEVEL = 3
+
+
+def is_binary_format(buffer: bytes) -> bool:
+    return buffer.startswith(BINARY_FORMAT_MAGIC)
+
+
+def encode_binary_format(obj: Any) -> bytes:
+    compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    payload = compressor.compress(msgpack.packb(obj))
+    return BINARY_FORMAT_MAGIC + bytes([BINARY_FORMAT_VERSION]) + payload
+
+
+def decode_binary_format(buffer: bytes) -> Any:
+    header_size = len(BINARY_FORMAT_MAGIC) + 1
+    version = buffer[header_size - 1]
+
+    if version != BINARY_FORMAT_VERSION:
+        raise ValueError(f"Unsupported binary format version: {version}")
+
+    decompressor = zstandard.ZstdDecompressor()
+    return msgpack.unpackb(decompressor.decompress(buffer[header_size:]))
@@ -1,6 +1,7 @@
 import io
 from base64 import b64decode, b64encode
 from io import BytesIO
+from typing import Tuple
 
 from PIL import Image
 
@@ -22,9 +23,14 @@ def data_url_to_image(data_url: str) -> Image.Image:
     return base64_to_image(base64)
 
 
-def image_to_mask(image: Image.Image, threshold: int = 0) -> Image.Image:
-    grayscale_image = image.convert("L")
-    return grayscale_image.point(lambda p: 255 if p > threshold else 0)
+def data_url_to_buffer(data_url: str) -> Tuple[bytes, str]:
+    header, base64 = data_url.split(",", 1)
+    content_type = header[len("data:") :].split(";")[0]
+    return b64decode(base64), content_type
+
+
+def buffer_to_data_url(buffer: bytes, content_type: str) -> str:
+    return f"data:{content_type};base64,{b64encode(buffer).decode()}"
 
 
 def image_to_buffer(image: Image.Image) -> bytes:
@@ -1,7 +1,8 @@
 import os
+from typing import Any, Dict, Literal, Optional
 
 from dotenv import load_dotenv
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, Json
 
 load_dotenv()
 
@@ -12,6 +13,22 @@ class Environment(BaseModel):
     GOOGLE_API_KEY: str = Field(...)
     ML_SERVICE_API_BASE_URL: str = Field(...)
     ML_SERVICE_API_VERSION: str = Field(...)
+    CHAT_TTL_DAYS: float = Field(...)
+    COMPACTION_INTERVAL_SECONDS: float = Field(...)
+    COMPACTION_BATCH_SIZE: int = Field(...)
+    COMPACTION_BATCH_DELAY_SECONDS: float = Field(...)
+    CONTEXT_FORMAT: Literal["json", "binary"] = Field(...)
+    IMAGE_WORKERS: int = Field(...)
+    ROI_CROPPING: bool = Field(...)
+    ROI_MARGIN: int = Field(...)
+    MAX_INFERENCE_SIZE: int = Field(...)
+    ML_CACHE_TTL_SECONDS: float = Field(...)
+    ML_CACHE_DIR: Optional[str] = Field(...)
+    ML_MAX_CONNECTIONS: int = Field(...)
+    ML_ENDPOINT_CONCURRENCY: int = Field(...)
+    ML_REQUEST_TIMEOUT_SECONDS: float = Field(...)
+    LLM_MAX_CONNECTIONS: int = Field(...)
+    LLM_CONFIGS: Json[Dict[str, Dict[str, Any]]] = Field(...)
 
 
 ENV = Environment(
@@ -20,4 +37,20 @@ ENV = Environment(
     GOOGLE_API_KEY=os.getenv("GOOGLE_API_KEY"),
     ML_SERVICE_API_BASE_URL=os.getenv("ML_SERVICE_API_BASE_URL"),
     ML_SERVICE_API_VERSION=os.getenv("ML_SERVICE_API_VERSION"),
+    CHAT_TTL_DAYS=os.getenv("CHAT_TTL_DAYS", 30),
+    COMPACTION_INTERVAL_SECONDS=os.getenv("COMPACTION_INTERVAL_SECONDS", 3600),
+    COMPACTION_BATCH_SIZE=os.getenv("COMPACTION_BATCH_SIZE", 500),
+    COMPACTION_BATCH_DELAY_SECONDS=os.getenv("COMPACTION_BATCH_DELAY_SECONDS", 0.5),
+    CONTEXT_FORMAT=os.getenv("CONTEXT_FORMAT", "json"),
+    IMAGE_WORKERS=os.getenv("IMAGE_WORKERS", os.cpu_count()),
+    ROI_CROPPING=os.getenv("ROI_CROPPING", True),
+    ROI_MARGIN=os.getenv("ROI_MARGIN", 128),
+    MAX_INFERENCE_SIZE=os.getenv("MAX_INFERENCE_SIZE", 1024),
+    ML_CACHE_TTL_SECONDS=os.getenv("ML_CACHE_TTL_SECONDS", 86400),
+    ML_CACHE_DIR=os.getenv("ML_CACHE_DIR"),
+    ML_MAX_CONNECTIONS=os.getenv("ML_MAX_CONNECTIONS", 32),
+    ML_ENDPOINT_CONCURRENCY=os.getenv("ML_ENDPOINT_CONCURRENCY", 4),
+    ML_REQUEST_TIMEOUT_SECONDS=os.getenv("ML_REQUEST_TIMEOUT_SECONDS", 120),
+    LLM_MAX_CONNECTIONS=os.getenv("LLM_MAX_CONNECTIONS", 16),
+    LLM_CONFIGS=os.getenv("LLM_CONFIGS", "{}"),
 )
@@ -0,0 +1,28 @@
+import asyncio
+import json
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+Event = Dict[str, Any]
+
+_event_queue: ContextVar[Optional[asyncio.Queue]] = ContextVar(
+    "event_queue", default=None
+)
+
+
+def emit_event(type: str, **data: Any) -> None:
+    if queue := _event_queue.get():
+        queue.put_nowait({"type": type, **data})
+
+
+def has_event_queue() -> bool:
+    return _event_queue.get() is not None
+
+
+def set_event_queue(queue: Optional[asyncio.Queue]) -> None:
+    _event_queue.set(queue)
+
+
+def format_sse(event: Event) -> str:
+    data = {k: v for k, v in event.items() if k != "type"}
+    return f"event: {event['type']}\ndata: {json.dumps(data, default=str)}\n\n"
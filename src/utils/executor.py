@@ -0,0 +1,15 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+from utils.env import ENV
+
+_executor = ThreadPoolExecutor(
+    max_workers=ENV.IMAGE_WORKERS, thread_name_prefix="image-worker"
+)
+
+
+async def run_in_executor(func: Callable, *args: Any, **kwargs: Any) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(func, *args, **kwargs))
@@ -1,8 +1,22 @@
+from typing import Optional
+
 import aiohttp
 
+_session: Optional[aiohttp.ClientSession] = None
+
 
 async def fetch_file_as_bytes(url: str) -> bytes:
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            response.raise_for_status()
-            return await response.read()
+    global _session
+    if not _session or _session.closed:
+        _session = aiohttp.ClientSession()
+
+    async with _session.get(url) as response:
+        response.raise_for_status()
+        return await response.read()
+
+
+async def close_fetch_session() -> None:
+    global _session
+    if _session:
+        await _session.close()
+        _session = None
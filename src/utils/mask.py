@@ -0,0 +1,63 @@
+from typing import Optional, Tuple
+
+import numpy as np
+import PIL.Image
+from PIL.Image import Image
+
+Box = Tuple[int, int, int, int]
+
+
+def image_to_rgb_array(image: Image) -> np.ndarray:
+    return np.asarray(image if image.mode == "RGB" else image.convert("RGB"))
+
+
+def image_to_alpha_array(image: Image) -> np.ndarray:
+    return np.asarray(image if image.mode == "L" else image.convert("L"))
+
+
+def image_to_mask_array(image: Image, threshold: int = 0) -> np.ndarray:
+    if "A" in image.getbands():
+        array = np.asarray(image.getchannel("A"))
+    else:
+        array = np.asarray(image.convert("L"))
+
+    return array > threshold
+
+
+def get_mask_box(mask: np.ndarray) -> Optional[Box]:
+    rows = np.flatnonzero(mask.any(axis=1))
+    if rows.size == 0:
+        return None
+
+    cols = np.flatnonzero(mask.any(axis=0))
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+def cut_out(image: np.ndarray, alpha: np.ndarray, box: Box) -> Image:
+    left, top, right, bottom = box
+    obj_alpha = alpha[top:bottom, left:right]
+    obj_array = np.empty((*obj_alpha.shape, 4), dtype=np.uint8)
+    np.multiply(
+        image[top:bottom, left:right],
+        (obj_alpha > 0)[..., None],
+        out=obj_array[..., :3],
+        casting="unsafe",
+    )
+    obj_array[..., 3] = obj_alpha
+    return PIL.Image.fromarray(obj_array, "RGBA")
+
+
+def paste_mask(union: np.ndarray, mask: np.ndarray, left: int, top: int) -> None:
+    height, width = union.shape
+    x0, y0 = max(left, 0), max(top, 0)
+    x1 = min(left + mask.shape[1], width)
+    y1 = min(top + mask.shape[0], height)
+    if x0 >= x1 or y0 >= y1:
+        return
+
+    region = mask[y0 - top : y1 - top, x0 - left : x1 - left]
+    union[y0:y1, x0:x1] |= region
+
+
+def mask_array_to_image(mask: np.ndarray) -> Image:
+    return PIL.Image.fromarray(mask.astype(np.uint8) * 255, "L")
@@ -0,0 +1,201 @@
+import io
+import struct
+import time
+import zipfile
+import zlib
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+
+LOCAL_FILE_HEADER_SIGNATURE = b"PK\x03\x04"
+DATA_DESCRIPTOR_SIGNATURE = b"PK\x07\x08"
+LOCAL_FILE_HEADER_SIZE = 30
+STORED = 0
+DEFLATED = 8
+DATA_DESCRIPTOR_FLAG = 0x08
+ZIP64_LIMIT = 0xFFFFFFFF
+COMPRESSION_SAMPLE_SIZE = 64 * 1024
+MIN_COMPRESSION_RATIO = 0.9
+
+
+class ZipStreamParser:
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._entry: Optional[Tuple[str, int, int, bool]] = None
+        self._chunks: List[bytes] = []
+        self._decompressor = None
+        self._fallback: Optional[bytearray] = None
+        self._done = False
+
+    def feed(self, chunk: bytes) -> Iterator[Tuple[str, bytes]]:
+        if self._fallback is not None:
+            self._fallback.extend(chunk)
+            return
+
+        self._buffer.extend(chunk)
+
+        while not self._done:
+            if self._entry is None and not self._read_header():
+                return
+
+            entry = self._read_entry()
+            if entry is None:
+                return
+
+            yield entry
+
+    def close(self) -> Iterator[Tuple[str, bytes]]:
+        if self._fallback is not None:
+            return iter_buffered_entries(bytes(self._fallback))
+
+        if self._entry is not None:
+            raise ValueError("Truncated zip stream")
+
+        return iter(())
+
+    def _read_header(self) -> bool:
+        if len(self._buffer) < 4:
+            return False
+
+        if self._buffer[:4] != LOCAL_FILE_HEADER_SIGNATURE:
+            self._done = True
+            self._buffer.clear()
+            return False
+
+        if len(self._buffer) < LOCAL_FILE_HEADER_SIZE:
+            return False
+
+        flags, method = struct.unpack_from("<HH", self._buffer, 6)
+        compressed_size = struct.unpack_from("<I", self._buffer, 18)[0]
+        name_length, extra_length = struct.unpack_from("<HH", self._buffer, 26)
+        header_size = LOCAL_FILE_HEADER_SIZE + name_length + extra_length
+        if len(self._buffer) < header_size:
+            return False
+
+        has_descriptor = bool(flags & DATA_DESCRIPTOR_FLAG)
+        if (
+            method not in (STORED, DEFLATED)
+            or (has_descriptor and method == STORED)
+            or compressed_size == ZIP64_LIMIT
+        ):
+            self._fallback = self._buffer
+            self._buffer = bytearray()
+            self._done = True
+            return False
+
+        name_end = LOCAL_FILE_HEADER_SIZE + name_length
+        name = bytes(self._buffer[LOCAL_FILE_HEADER_SIZE:name_end]).decode()
+        del self._buffer[:header_size]
+
+        self._entry = (name, method, compressed_size, has_descriptor)
+        self._chunks = []
+        self._decompressor = zlib.decompressobj(-15) if method == DEFLATED else None
+        return True
+
+    def _read_entry(self) -> Optional[Tuple[str, bytes]]:
+        name, method, compressed_size, has_descriptor = self._entry
+
+        if method == STORED:
+            if len(self._buffer) < compressed_size:
+                return None
+
+            data = bytes(self._buffer[:compressed_size])
+            del self._buffer[:compressed_size]
+
+        else:
+            if has_descriptor:
+                if not self._decompressor.eof:
+                    chunk = self._decompressor.decompress(bytes(self._buffer))
+                    self._chunks.append(chunk)
+                    self._buffer = bytearray(self._decompressor.unused_data)
+
+                if not self._decompressor.eof:
+                    return None
+
+                if not self._skip_data_descriptor():
+                    return None
+
+            else:
+                if len(self._buffer) < compressed_size:
+                    return None
+
+                compressed = bytes(self._buffer[:compressed_size])
+                del self._buffer[:compressed_size]
+                self._chunks.append(self._decompressor.decompress(compressed))
+
+            data = b"".join(self._chunks)
+
+        self._entry = None
+        self._chunks = []
+        self._decompressor = None
+        return name, data
+
+    def _skip_data_descriptor(self) -> bool:
+        if len(self._buffer) < 16:
+            return False
+
+        if self._buffer[:4] == DATA_DESCRIPTOR_SIGNATURE:
+            del self._buffer[:16]
+        else:
+            del self._buffer[:12]
+
+        return True
+
+
+async def iter_zip_stream(
+    chunks: AsyncIterator[bytes],
+) -> AsyncIterator[Tuple[str, bytes]]:
+    parser = ZipStreamParser()
+    async for chunk in chunks:
+        for entry in parser.feed(chunk):
+            yield entry
+
+    for entry in parser.close():
+        yield entry
+
+
+def iter_buffered_entries(buffer: bytes) -> Iterator[Tuple[str, bytes]]:
+    with zipfile.ZipFile(io.BytesIO(buffer)) as zip_file:
+        for info in zip_file.infolist():
+            if info.header_offset >= 0 and not info.is_dir():
+                yield info.filename, zip_file.read(info)
+
+
+class ZipStreamWriter:
+    def __init__(self) -> None:
+        self._sink = ZipSink()
+        self._zip = zipfile.ZipFile(self._sink, "w")
+
+    def write(self, name: str, buffer: bytes) -> bytes:
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        info.compress_type = choose_compression(buffer)
+        self._zip.writestr(info, buffer)
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        self._zip.close()
+        return self._sink.drain()
+
+
+class ZipSink(io.RawIOBase):
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        self._buffer.extend(data)
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def choose_compression(buffer: bytes) -> int:
+    sample = buffer[:COMPRESSION_SAMPLE_SIZE]
+    if not sample:
+        return zipfile.ZIP_STORED
+
+    ratio = len(zlib.compress(sample, 1)) / len(sample)
+    return zipfile.ZIP_DEFLATED if ratio < MIN_COMPRESSION_RATIO else zipfile.ZIP_STORED
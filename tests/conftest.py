@@ -0,0 +1,100 @@
+import asyncio
+import os
+import sys
+from typing import Any, Dict, Optional
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017/test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+os.environ.setdefault("ML_SERVICE_API_BASE_URL", "http://localhost")
+os.environ.setdefault("ML_SERVICE_API_VERSION", "v1")
+
+from beanie import init_beanie
+from bson import ObjectId
+from gridfs.errors import NoFile
+from mongomock_motor import AsyncMongoMockClient
+
+import lib.db
+import lib.fs
+from models.chat import Chat
+from models.phase import ChatPhase
+from utils.time import utc_now
+
+
+class MockGridOut:
+    def __init__(self, data: bytes, metadata: Optional[Dict[str, Any]]) -> None:
+        self.metadata = metadata
+        self._data = data
+
+    async def readchunk(self) -> bytes:
+        data, self._data = self._data, b""
+        return data
+
+
+class MockGridIn:
+    def __init__(self, bucket: "MockGridFSBucket", filename: str, metadata) -> None:
+        self._id = ObjectId()
+        self._bucket = bucket
+        self._filename = filename
+        self._metadata = metadata
+        self._data = bytearray()
+
+    async def write(self, data: bytes) -> None:
+        self._data.extend(data)
+
+    async def close(self) -> None:
+        await self._bucket.files.insert_one(
+            {
+                "_id": self._id,
+                "filename": self._filename,
+                "length": len(self._data),
+                "uploadDate": utc_now(),
+                "metadata": self._metadata,
+            }
+        )
+        await self._bucket.chunks.insert_one(
+            {"files_id": self._id, "n": 0, "data": bytes(self._data)}
+        )
+
+
+class MockGridFSBucket:
+    def __init__(self, database: Any, name: str) -> None:
+        self.files = database[f"{name}.files"]
+        self.chunks = database[f"{name}.chunks"]
+
+    def open_upload_stream(self, filename: str, metadata=None) -> MockGridIn:
+        return MockGridIn(self, filename, metadata)
+
+    async def open_download_stream(self, file_id: ObjectId) -> MockGridOut:
+        return await self._open(await self.files.find_one({"_id": file_id}))
+
+    async def open_download_stream_by_name(self, filename: str) -> MockGridOut:
+        cursor = self.files.find({"filename": filename}).sort("uploadDate", -1)
+        docs = await cursor.to_list(length=1)
+        return await self._open(docs[0] if docs else None)
+
+    async def _open(self, doc: Optional[Dict[str, Any]]) -> MockGridOut:
+        if not doc:
+            raise NoFile()
+
+        chunk = await self.chunks.find_one({"files_id": doc["_id"]})
+        return MockGridOut(chunk["data"], doc.get("metadata"))
+
+
+@pytest.fixture
+def mock_db(monkeypatch):
+    client = AsyncMongoMockClient(os.environ["MONGO_URI"])
+    database = client.get_database()
+
+    monkeypatch.setattr(lib.db, "db", database)
+    monkeypatch.setattr(lib.fs, "client", client)
+    monkeypatch.setattr(
+        lib.fs, "get_bucket", lambda name: MockGridFSBucket(database, name)
+    )
+    asyncio.run(init_beanie(database=database, document_models=[Chat, ChatPhase]))
+
+    return database
@@ -0,0 +1,64 @@
+import asyncio
+from datetime import timedelta
+
+from core.providers.fabric.fabric_provider import FabricProvider
+from core.providers.fabric.models.fabric_canvas import FabricCanvas
+from core.providers.fabric.models.fabric_image import FabricImage
+from lib.blobs import BLOB_BUCKET_NAME, flush_blobs, put_blob
+from lib.compaction import compact
+from lib.context_store import MANIFEST_BUCKET_NAME, VALUE_BUCKET_NAME, save_context
+from lib.fs import delete_files, touch_file, write_file
+from models.chat import Chat, ChatState
+from utils.codec import is_binary_format
+from utils.env import ENV
+from utils.time import utc_now
+
+
+def test_compaction_keeps_blobs_of_binary_contexts(mock_db, monkeypatch):
+    monkeypatch.setattr(ENV, "CONTEXT_FORMAT", "binary")
+
+    async def run() -> None:
+        ref = put_blob(b"live image", "image/png")
+        await write_file(BLOB_BUCKET_NAME, "sha256:" + "0" * 64, b"orphan image")
+
+        provider = FabricProvider()
+        provider.load_context_from_buffers({})
+        background = FabricImage(src=ref, filename="cat.png", width=1, height=1)
+        provider.get_context()["image0"] = FabricCanvas(backgroundImage=background)
+        buffers = provider.save_context_to_buffers()
+        assert is_binary_format(buffers["image0"])
+
+        await flush_blobs()
+        context_id, _ = await save_context(buffers, {})
+        await Chat(state=ChatState(context_id=context_id)).insert()
+
+        expired = {"$set": {"uploadDate": utc_now() - timedelta(days=1)}}
+        for bucket in (MANIFEST_BUCKET_NAME, VALUE_BUCKET_NAME, BLOB_BUCKET_NAME):
+            await mock_db[f"{bucket}.files"].update_many({}, expired)
+
+        report = await compact()
+
+        assert report.deleted_files == 1
+        assert await touch_file(BLOB_BUCKET_NAME, ref)
+        assert not await touch_file(BLOB_BUCKET_NAME, "sha256:" + "0" * 64)
+
+    asyncio.run(run())
+
+
+def test_delete_files_keeps_files_touched_after_expiry(mock_db):
+    async def run() -> None:
+        stale_id = await write_file(BLOB_BUCKET_NAME, "stale", b"stale")
+        touched_id = await write_file(BLOB_BUCKET_NAME, "touched", b"touched")
+        expiry = utc_now() - timedelta(hours=1)
+        old = {"$set": {"uploadDate": expiry - timedelta(days=1)}}
+        await mock_db[f"{BLOB_BUCKET_NAME}.files"].update_one({"_id": stale_id}, old)
+
+        deleted = await delete_files(BLOB_BUCKET_NAME, [stale_id, touched_id], expiry)
+
+        assert [doc["_id"] for doc in deleted] == [stale_id]
+        assert await touch_file(BLOB_BUCKET_NAME, "touched")
+        chunks = mock_db[f"{BLOB_BUCKET_NAME}.chunks"]
+        assert await chunks.count_documents({"files_id": stale_id}) == 0
+        assert await chunks.count_documents({"files_id": touched_id}) == 1
+
+    asyncio.run(run())
@@ -0,0 +1,90 @@
+import asyncio
+
+from core.controller.execute import execute
+from core.providers.fabric.fabric_provider import FabricProvider
+from core.providers.fabric.models.fabric_canvas import FabricCanvas
+from core.providers.fabric.models.fabric_image import FabricImage
+from lib.ml_client import MLServiceError
+from models.phase import Message
+from schemas.file import File
+from utils.events import set_event_queue
+
+
+async def fail_inpainting(self, *args, **kwargs) -> None:
+    raise MLServiceError("http://localhost/lama", 503)
+
+
+def convert_object_to_file(obj) -> File:
+    return File(name="image0.fcanvas", content_type="application/json", buffer=b"{}")
+
+
+def run_with_events(commands, provider):
+    async def run():
+        queue = asyncio.Queue()
+        set_event_queue(queue)
+        execution = await execute(commands, provider)
+        return execution, [queue.get_nowait() for _ in range(queue.qsize())]
+
+    return asyncio.run(run())
+
+
+def create_provider() -> FabricProvider:
+    background = FabricImage(src="sha256:" + "0" * 64, width=64, height=64)
+    obj = FabricImage(src="sha256:" + "1" * 64, width=8, height=8, inpainted=False)
+    canvas = FabricCanvas(backgroundImage=background, objects=[obj])
+
+    provider = FabricProvider()
+    provider.set_language("en")
+    provider.load_context_from_buffers({})
+    provider.get_context().update({"image0": canvas, "object0": obj})
+    return provider
+
+
+def test_failed_inpainting_rolls_back_pending_canvases(mock_db, monkeypatch):
+    monkeypatch.setattr(FabricCanvas, "_inpaint_background", fail_inpainting)
+    provider = create_provider()
+    commands = [
+        "image0 = await remove_children(image0, [object0])",
+        "image1 = await flip_image_or_children(image0, axis='x')",
+        "await response_to_user(text='done', attachments=[image1])",
+    ]
+
+    execution = asyncio.run(execute(commands, provider))
+
+    context = provider.get_context()
+    assert execution.response is None
+    assert execution.feedback.type == "error"
+    assert commands[0] in execution.feedback.text
+    assert "image1" not in context
+    assert len(context["image0"].objects) == 1
+    assert context["object0"].inpainted is False
+
+
+def test_execute_without_commands_skips_materialization(mock_db, monkeypatch):
+    monkeypatch.setattr(FabricCanvas, "_inpaint_background", fail_inpainting)
+    provider = create_provider()
+    context = provider.get_context()
+    context["image0"].defer_inpainting([context["object0"]])
+
+    execution = asyncio.run(execute([], provider))
+
+    assert execution.commands == []
+    assert execution.feedback.type == "info"
+
+
+def test_feedback_attachments_are_emitted_after_materialization(mock_db, monkeypatch):
+    monkeypatch.setattr(FabricCanvas, "_inpaint_background", fail_inpainting)
+    provider = create_provider()
+    feedback = Message(src="system", type="info", text="ok", varnames=["image0"])
+    monkeypatch.setattr(provider, "get_feedback", lambda: feedback)
+    monkeypatch.setattr(provider, "convert_object_to_file", convert_object_to_file)
+
+    _, events = run_with_events(["x = 1", "y = 2"], provider)
+    assert [event["type"] for event in events] == ["command", "command"] + [
+        "attachment"
+    ] * 2
+
+    _, events = run_with_events(
+        ["image0 = await remove_children(image0, [object0])"], provider
+    )
+    assert [event["type"] for event in events] == ["command"]
@@ -0,0 +1,53 @@
+import asyncio
+from typing import Iterable, List
+
+from core.controller.generate import generate
+from core.controller.helpers import CommandStreamParser
+from core.llms.llm import LLM
+from core.providers.fabric.fabric_provider import FabricProvider
+from models.phase import Message
+
+
+class ScriptedLLM(LLM):
+    def __init__(self, answers: List[str]) -> None:
+        self.answers = answers
+
+    async def __call__(self, messages: Iterable[str]) -> str:
+        return self.answers.pop(0)
+
+
+def parse_stream(text: str, chunk_size: int) -> List[str]:
+    parser = CommandStreamParser()
+    commands = []
+
+    for i in range(0, len(text), chunk_size):
+        commands += parser.feed(text[i : i + chunk_size])
+
+    return commands + parser.close()
+
+
+def test_command_stream_parser_normalizes_section():
+    answers = [
+        "THINKING: a\nCOMMANDS: x = 1\ny = 2",
+        "THINKING: a\nCOMMANDS:\n\n    x = 1\n    y = 2\nOBSERVATION: b",
+    ]
+
+    for answer in answers:
+        for chunk_size in (1, 4, len(answer)):
+            assert parse_stream(answer, chunk_size) == ["x = 1", "y = 2"]
+
+
+def test_truncated_commands_report_syntax_error(mock_db):
+    provider = FabricProvider()
+    provider.set_language("en")
+    provider.load_context_from_buffers({})
+    request = Message(src="user", type="request", text="t")
+    llm = ScriptedLLM(["THINKING: a\nCOMMANDS:\nx = 1\ny = 2\nz = (3"])
+
+    new_phase = asyncio.run(generate(request, [], llm, provider, 1))
+
+    execution = new_phase.prompt_phases[0].execution
+    assert execution.commands == ["x = 1", "y = 2"]
+    assert execution.feedback.type == "error"
+    assert "SyntaxError" in execution.feedback.text
+    assert new_phase.response is None
@@ -0,0 +1,8 @@
+from core.providers.lazy_context import LazyContext
+
+
+def test_lazy_context_can_be_iterated_while_loading():
+    context = LazyContext({"a": b"1", "b": b"2"}, int)
+
+    assert dict(context) == {"a": 1, "b": 2}
+    assert list(context.values()) == [1, 2]
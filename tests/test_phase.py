@@ -0,0 +1,37 @@
+import asyncio
+
+from bson import DBRef, ObjectId
+
+from models.chat import Chat, ChatState
+from models.phase import ChatPhase, Message
+from routes.phase import get_recent_phases
+
+
+def create_phase(text: str, answered: bool = True) -> ChatPhase:
+    request = Message(src="user", type="request", text=text)
+    response = Message(src="llm", type="response", text=text) if answered else None
+    return ChatPhase(request=request, response=response)
+
+
+def test_recent_phases_ignore_unlinked_phases(mock_db):
+    async def run() -> None:
+        chat = Chat(state=ChatState(context_id=ObjectId()))
+        await chat.insert()
+
+        linked = [create_phase(f"turn {i}") for i in range(3)]
+        linked += [create_phase(f"failed turn {i}", False) for i in range(4)]
+        for phase in linked:
+            await phase.insert()
+
+        await create_phase("rejected turn").insert()
+        phase_refs = [DBRef(ChatPhase.get_collection_name(), p.id) for p in linked]
+        await Chat.get_motor_collection().update_one(
+            {"_id": chat.id}, {"$set": {"phases": phase_refs}}
+        )
+
+        chat = await Chat.get(chat.id)
+        phases = await get_recent_phases(chat, 2)
+
+        assert [phase.request.text for phase in phases] == ["turn 1", "turn 2"]
+
+    asyncio.run(run())
@@ -0,0 +1,39 @@
+import asyncio
+import io
+import random
+import zipfile
+from typing import AsyncIterator, List, Tuple
+
+from utils.zip_stream import ZipStreamWriter, iter_zip_stream
+
+ENTRIES = [("0.9.png", random.Random(0).randbytes(4096)), ("0.5.txt", b"a" * 4096)]
+
+
+async def iter_chunks(buffer: bytes, size: int) -> AsyncIterator[bytes]:
+    for i in range(0, len(buffer), size):
+        yield buffer[i : i + size]
+
+
+def read_entries(buffer: bytes) -> List[Tuple[str, bytes]]:
+    async def run() -> List[Tuple[str, bytes]]:
+        return [entry async for entry in iter_zip_stream(iter_chunks(buffer, 7))]
+
+    return asyncio.run(run())
+
+
+def test_zip_stream_reads_writer_output():
+    writer = ZipStreamWriter()
+    buffer = b"".join(writer.write(name, data) for name, data in ENTRIES)
+    buffer += writer.close()
+
+    assert read_entries(buffer) == ENTRIES
+
+
+def test_zip_stream_falls_back_for_zip64_entries():
+    stream = io.BytesIO()
+    with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr(*ENTRIES[1])
+        with zip_file.open(ENTRIES[0][0], "w", force_zip64=True) as file:
+            file.write(ENTRIES[0][1])
+
+    assert read_entries(stream.getvalue()) == ENTRIES[::-1]